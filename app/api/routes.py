@@ -1,202 +1,368 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Query
 from sqlalchemy.orm import Session
-from db.crud import insert_transaction, insert_transactions_batch, get_db
-from db.models import Transaction
-from services.csv_parser import parse_csv
-from services.pdf_parser import parse_pdf
-from services.ai_parser import parse_with_ai
-from services.insights import get_summary, get_categories, get_monthly_trends, detect_recurring_expenses, detect_anomalies, forecast_expenses
-import pandas as pd
-from io import StringIO, BytesIO
-from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+from db.data_version import aread_data_version, read_data_version
+from db.crud import get_db, get_read_db, get_async_read_db, alist_transactions, run_with_read_session, TRANSACTION_SORTS
+from services.ingest import ingest_csv, ingest_pdf, ingest_parquet
+from services.jobs import submit_job, get_job, list_jobs, JobQueueFull
+from services.llm_cache import get_llm_cache
+from services.llm_gateway import get_llm_gateway
+from services.categorizer import VALID_CATEGORIES
+from services.merchant_rules import list_rules, add_manual_rule, learn_rules_from_transactions, normalize_description
+from services.upload_cache import list_cached_uploads, evict_cached_upload, clear_upload_cache, UPLOAD_CACHE_MAX_ENTRIES
+from services.duplicates import list_near_duplicates, run_duplicate_scan
+from services.exporter import ahas_transactions, stream_csv, write_excel
+from services.columnar import arrow_available, write_parquet, stream_arrow, ARROW_STREAM_MEDIA_TYPE
+from services.insights import get_summary, get_categories, get_monthly_trends, aget_rollup_summary, aget_rollup_categories, aget_rollup_monthly_trends, detect_recurring_expenses, detect_anomalies, forecast_expenses, compute_insight
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 import logging
-from functools import lru_cache
+from functools import partial
+import os
+import tempfile
+from datetime import date
+from typing import Optional
 import time
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Simple cache for insights data
+# Simple cache for insights data, tagged with the reader's data version (see db/data_version.py)
 _insights_cache = {}
-_cache_timestamp = 0
 CACHE_DURATION = 300  # 5 minutes
+# Primary's data version after this process's last completed write; a reader below it is a lagging replica
+_written_version = 0
+
+async def _get_cached_or_compute(cache_key, compute_func, db):
+    """
+    Get data from cache or compute it fresh (compute_func is a coroutine function) if cache is stale.
+
+    An entry is only served while the reader is still at the data version it
+    was computed from. Results computed on a replica that has not caught up
+    with our last write are returned but not cached, so they are not served
+    for CACHE_DURATION after the replica catches up.
+    """
+    version, _ = await aread_data_version(db)
+    cached = _insights_cache.get(cache_key)
+    if cached and cached[0] == version and time.time() - cached[1] < CACHE_DURATION:
+        return cached[2]
 
-def _get_cached_or_compute(cache_key, compute_func, db):
-    """Get data from cache or compute it fresh if cache is stale."""
-    global _insights_cache, _cache_timestamp
-    
-    current_time = time.time()
-    
-    # Check if cache is still valid
-    if current_time - _cache_timestamp < CACHE_DURATION and cache_key in _insights_cache:
-        return _insights_cache[cache_key]
-    
     # Compute fresh data
-    result = compute_func(db)
-    
-    # Update cache
-    _insights_cache[cache_key] = result
-    _cache_timestamp = current_time
-    
+    result = await compute_func(db)
+
+    if version >= _written_version:
+        _insights_cache[cache_key] = (version, time.time(), result)
     return result
 
 def _invalidate_cache():
-    """Invalidate the insights cache when new data is added."""
-    global _insights_cache, _cache_timestamp
+    """Invalidate the insights cache when new data is added, and record the primary's data version."""
+    global _written_version
     _insights_cache.clear()
-    _cache_timestamp = 0
-
-@router.post("/upload-csv")
-async def upload_csv(request: Request, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    logger.info(f"CSV upload request received: {file.filename}, size: {file.size} bytes")
+    from config import SessionLocal
+    db = SessionLocal()
     try:
-        content = await file.read()
-        transactions = parse_csv(content)
-        logger.info(f"CSV parsing complete, extracted {len(transactions)} transactions")
-
-        inserted_count = insert_transactions_batch(db, transactions)
-        _invalidate_cache()  # Invalidate cache when new data is added
-        logger.info(f"Successfully inserted {inserted_count} transactions into database (duplicates skipped)")
-        return {"inserted": inserted_count}
+        _written_version = max(_written_version, read_data_version(db)[0])
     except Exception as e:
-        logger.error(f"CSV upload failed: {str(e)}")
-        return {"error": f"Failed to process CSV: {str(e)}"}
+        logger.warning(f"Could not read the data version after a write: {e}")
+    finally:
+        db.close()
 
-@router.post("/upload-pdf")
-async def upload_pdf(request: Request, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    logger.info(f"PDF upload request received: {file.filename}, size: {file.size} bytes")
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024
+
+def _require_arrow():
+    if not arrow_available():
+        raise HTTPException(status_code=501, detail="Parquet/Arrow support requires the pyarrow package")
+
+def _job_accepted(job):
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+def _submit_or_503(kind, filename, pipeline, cleanup=None):
     try:
-        content = await file.read()
-        logger.info(f"PDF file read successfully, {len(content)} bytes")
-
-        # Step 1: Extract text from PDF
-        extracted_text = parse_pdf(content)
-        if not extracted_text:
-            return {"error": "Failed to extract text from PDF"}
-
-        # Step 2: Parse transactions with AI
-        transactions = parse_with_ai(extracted_text)
-        logger.info(f"AI parsing complete, extracted {len(transactions)} transactions")
-
-        inserted_count = insert_transactions_batch(db, transactions)
-        _invalidate_cache()  # Invalidate cache when new data is added
-        logger.info(f"Successfully inserted {inserted_count} transactions into database (duplicates skipped)")
-        return {"message": "PDF processed", "transactions": inserted_count}
-    except Exception as e:
-        logger.error(f"PDF upload failed: {str(e)}")
-        return {"error": f"Failed to process PDF: {str(e)}"}
+        return submit_job(kind, filename, pipeline, on_success=_invalidate_cache)
+    except JobQueueFull as e:
+        if cleanup:
+            cleanup()
+        logger.warning(f"{kind.upper()} upload rejected: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+
+async def _spool_upload(file: UploadFile, suffix: str) -> str:
+    """
+    Spool an upload to a temp file so the worker can stream it after the request ends.
+
+    Disk writes run in the thread pool, so a large upload does not block the
+    event loop. Returns the file's path.
+    """
+    spool = await run_in_threadpool(tempfile.NamedTemporaryFile, suffix=suffix, delete=False)
+    try:
+        while chunk := await file.read(UPLOAD_READ_CHUNK_SIZE):
+            await run_in_threadpool(spool.write, chunk)
+        await run_in_threadpool(spool.close)
+    except BaseException:
+        spool.close()
+        os.remove(spool.name)
+        raise
+    return spool.name
+
+@router.post("/upload-csv", status_code=202)
+async def upload_csv(request: Request, file: UploadFile = File(...)):
+    logger.info(f"CSV upload request received: {file.filename}, size: {file.size} bytes")
+    path = await _spool_upload(file, ".csv")
+    job = _submit_or_503("csv", file.filename, lambda job: ingest_csv(job, path),
+                         cleanup=lambda: os.remove(path))
+    return _job_accepted(job)
+
+@router.post("/import/parquet", status_code=202)
+async def import_parquet(request: Request, file: UploadFile = File(...)):
+    _require_arrow()
+    logger.info(f"Parquet import request received: {file.filename}, size: {file.size} bytes")
+    path = await _spool_upload(file, ".parquet")
+    job = _submit_or_503("parquet", file.filename, lambda job: ingest_parquet(job, path),
+                         cleanup=lambda: os.remove(path))
+    return _job_accepted(job)
+
+@router.post("/upload-pdf", status_code=202)
+async def upload_pdf(request: Request, file: UploadFile = File(...)):
+    logger.info(f"PDF upload request received: {file.filename}, size: {file.size} bytes")
+    content = await file.read()
+    logger.info(f"PDF file read successfully, {len(content)} bytes")
+    job = _submit_or_503("pdf", file.filename, lambda job: ingest_pdf(job, content))
+    return _job_accepted(job)
+
+@router.get("/jobs")
+async def jobs_list(request: Request):
+    return {"jobs": [job.to_dict() for job in list_jobs()]}
+
+@router.get("/jobs/{job_id}")
+async def job_status(request: Request, job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/uploads/cache")
+def upload_cache_list(request: Request, db: Session = Depends(get_read_db)):
+    entries = list_cached_uploads(db)
+    return {"entries": entries, "total": len(entries), "max_entries": UPLOAD_CACHE_MAX_ENTRIES}
+
+@router.delete("/uploads/cache/{sha256}")
+def upload_cache_evict(request: Request, sha256: str, db: Session = Depends(get_db)):
+    if not evict_cached_upload(db, sha256):
+        raise HTTPException(status_code=404, detail="Cache entry not found")
+    logger.info(f"Upload cache entry {sha256[:12]} evicted")
+    return {"evicted": 1}
+
+@router.delete("/uploads/cache")
+def upload_cache_clear(request: Request, db: Session = Depends(get_db)):
+    evicted = clear_upload_cache(db)
+    logger.info(f"Upload cache cleared ({evicted} entries)")
+    return {"evicted": evicted}
+
+@router.get("/llm/cache")
+async def llm_cache_stats(request: Request):
+    return get_llm_cache().stats()
+
+@router.delete("/llm/cache")
+async def llm_cache_clear(request: Request):
+    evicted = get_llm_cache().clear()
+    logger.info(f"LLM response cache cleared ({evicted} entries)")
+    return {"evicted": evicted}
+
+@router.get("/llm/gateway")
+async def llm_gateway_stats(request: Request):
+    return get_llm_gateway().stats()
+
+class MerchantRuleIn(BaseModel):
+    pattern: str
+    category: str
+    match_type: str = "keyword"
+
+@router.get("/categorization/rules")
+def merchant_rules_list(request: Request, db: Session = Depends(get_read_db)):
+    rules = list_rules(db)
+    return {"rules": rules, "total": len(rules)}
+
+@router.post("/categorization/rules")
+def merchant_rules_add(request: Request, rule: MerchantRuleIn, db: Session = Depends(get_db)):
+    if rule.category not in VALID_CATEGORIES:
+        raise HTTPException(status_code=400, detail=f"Unknown category '{rule.category}'")
+    if rule.match_type not in ("keyword", "exact"):
+        raise HTTPException(status_code=400, detail="match_type must be 'keyword' or 'exact'")
+    pattern = normalize_description(rule.pattern)
+    if not pattern:
+        raise HTTPException(status_code=400, detail="Pattern is empty after normalization")
+    add_manual_rule(db, pattern, rule.match_type, rule.category)
+    return {"pattern": pattern, "match_type": rule.match_type, "category": rule.category, "source": "manual"}
+
+@router.post("/categorization/rules/learn")
+def merchant_rules_learn(request: Request, db: Session = Depends(get_db)):
+    learned = learn_rules_from_transactions(db)
+    return {"learned": learned}
+
+@router.get("/duplicates")
+def near_duplicates_list(request: Request, limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_read_db)):
+    pairs = list_near_duplicates(db, limit)
+    return {"pairs": pairs, "count": len(pairs)}
+
+@router.post("/duplicates/scan", status_code=202)
+async def near_duplicates_scan(request: Request):
+    job = _submit_or_503("duplicates", None, run_duplicate_scan)
+    return _job_accepted(job)
+
+async def _insight_card(cache_key, rollup_func, bounded_func, db, start_date, end_date):
+    """Whole-history cards come from the (cached) rollups; date-bounded ones query only the requested range."""
+    if start_date is None and end_date is None:
+        return await _get_cached_or_compute(cache_key, rollup_func, db)
+    return await compute_insight(partial(bounded_func, start_date=start_date, end_date=end_date))
 
 @router.get("/insights/summary")
-async def insights_summary(request: Request, db: Session = Depends(get_db)):
+async def insights_summary(request: Request, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                           db: AsyncSession = Depends(get_async_read_db)):
     logger.info("Request for insights summary")
-    result = _get_cached_or_compute("summary", get_summary, db)
+    result = await _insight_card("summary", aget_rollup_summary, get_summary, db, start_date, end_date)
     logger.info(f"Summary generated: {len(result)} items")
     return result
 
 @router.get("/insights/categories")
-async def insights_categories(request: Request, db: Session = Depends(get_db)):
+async def insights_categories(request: Request, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                              db: AsyncSession = Depends(get_async_read_db)):
     logger.info("Request for insights categories")
-    result = _get_cached_or_compute("categories", get_categories, db)
+    result = await _insight_card("categories", aget_rollup_categories, get_categories, db, start_date, end_date)
     logger.info(f"Categories generated: {len(result)} items")
     return result
 
 @router.get("/insights/monthly")
-async def insights_monthly(request: Request, db: Session = Depends(get_db)):
+async def insights_monthly(request: Request, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                           db: AsyncSession = Depends(get_async_read_db)):
     logger.info("Request for insights monthly trends")
-    result = _get_cached_or_compute("monthly", get_monthly_trends, db)
+    result = await _insight_card("monthly", aget_rollup_monthly_trends, get_monthly_trends, db, start_date, end_date)
     logger.info(f"Monthly trends generated: {len(result)} items")
     return result
 
 @router.get("/transactions")
 async def get_transactions(
     request: Request,
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: str = Query("date_desc", description=f"One of: {', '.join(TRANSACTION_SORTS)}"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    sign: Optional[str] = Query(None, description="'income' or 'expense'"),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get all transactions."""
+    """Get one page of transactions; pass next_cursor back as cursor for the next page."""
     logger.info("Request for transactions")
 
-    results = db.query(Transaction).all()
-
-    transactions = [{
-        "id": t.id,
-        "date": t.date.isoformat(),
-        "description": t.description,
-        "amount": t.amount,
-        "category": t.category
-    } for t in results]
+    try:
+        page = await alist_transactions(
+            db, limit=limit, cursor=cursor, sort=sort, start_date=start_date, end_date=end_date,
+            category=category, min_amount=min_amount, max_amount=max_amount, sign=sign,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    logger.info(f"Returned {len(transactions)} transactions")
-    return {"transactions": transactions, "total": len(transactions)}
+    logger.info(f"Returned {page['count']} transactions")
+    return page
 
 @router.get("/export/excel")
 async def export_excel(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    results = db.query(Transaction).all()
-
-    if not results:
+    if not await ahas_transactions(db):
         raise HTTPException(status_code=404, detail="No transactions to export")
 
-    df = pd.DataFrame([{
-        "date": t.date,
-        "description": t.description,
-        "amount": t.amount,
-        "category": t.category
-    } for t in results])
-
-    excel_buffer = BytesIO()
-    with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name="Transactions", index=False)
+    # The workbook is written to a temporary file off the event loop and removed once sent
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await run_in_threadpool(run_with_read_session, write_excel, path)
+    except Exception:
+        os.remove(path)
+        raise
 
-    excel_buffer.seek(0)
-    return StreamingResponse(
-        excel_buffer,
+    return FileResponse(
+        path,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=transactions.xlsx"}
+        filename="transactions.xlsx",
+        background=BackgroundTask(os.remove, path)
     )
 
 @router.get("/export/csv")
 async def export_csv(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    results = db.query(Transaction).all()
+    if not await ahas_transactions(db):
+        raise HTTPException(status_code=404, detail="No transactions to export")
 
-    if not results:
+    return StreamingResponse(
+        stream_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=transactions.csv"}
+    )
+
+@router.get("/export/parquet")
+async def export_parquet(
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    _require_arrow()
+    if not await ahas_transactions(db):
         raise HTTPException(status_code=404, detail="No transactions to export")
 
-    df = pd.DataFrame([{
-        "date": t.date,
-        "description": t.description,
-        "amount": t.amount,
-        "category": t.category
-    } for t in results])
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        await run_in_threadpool(run_with_read_session, write_parquet, path)
+    except Exception:
+        os.remove(path)
+        raise
 
-    csv_buffer = StringIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_content = csv_buffer.getvalue()
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename="transactions.parquet",
+        background=BackgroundTask(os.remove, path)
+    )
 
-    return {"csv": csv_content}
+@router.get("/export/arrow")
+async def export_arrow(
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    _require_arrow()
+    if not await ahas_transactions(db):
+        raise HTTPException(status_code=404, detail="No transactions to export")
+
+    return StreamingResponse(
+        stream_arrow(),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={"Content-Disposition": "attachment; filename=transactions.arrows"}
+    )
 
 @router.get("/insights/recurring")
-async def insights_recurring(request: Request, db: Session = Depends(get_db)):
+async def insights_recurring(request: Request):
     logger.info("Request for recurring expenses detection")
-    result = detect_recurring_expenses(db)
+    result = await compute_insight(detect_recurring_expenses)
     logger.info(f"Recurring expenses detected: {len(result)} items")
     return result
 
 @router.get("/insights/anomalies")
-async def insights_anomalies(request: Request, db: Session = Depends(get_db)):
+async def insights_anomalies(request: Request):
     logger.info("Request for anomaly detection")
-    result = detect_anomalies(db)
+    result = await compute_insight(detect_anomalies)
     logger.info(f"Anomalies detected: {len(result)} items")
     return result
 
 @router.get("/insights/forecast")
-async def insights_forecast(request: Request, db: Session = Depends(get_db)):
+async def insights_forecast(request: Request):
     logger.info("Request for expense forecasting")
-    result = forecast_expenses(db)
+    result = await compute_insight(forecast_expenses)
     logger.info(f"Forecast result: {result.get('message', 'Completed')}")
     return result
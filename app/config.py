@@ -1,36 +1,109 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, make_url, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.exc import OperationalError
 import os
-import time
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg2://finance_user:finance_pass@db:5432/finance")
+# Optional read replica for insights, listings and exports; falls back to the primary
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or DATABASE_URL
 
-def create_db_engine(max_retries=10, retry_delay=5):
-    """Create database engine with retry logic"""
+def _async_url(url: str) -> str:
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+# Same read database through the asyncpg driver, used by the async request handlers
+ASYNC_DATABASE_READ_URL = os.getenv("ASYNC_DATABASE_READ_URL") or _async_url(DATABASE_READ_URL)
+
+# Writer pool: ingest jobs, rollup maintenance, caches and rules. 0 disables the statement timeout
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "5"))
+DB_WRITE_MAX_OVERFLOW = int(os.getenv("DB_WRITE_MAX_OVERFLOW", "5"))
+DB_WRITE_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_WRITE_STATEMENT_TIMEOUT_MS", "0"))
+# Reader pool: dashboard reads and exports; applies to both the sync and the async reader
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", "10"))
+DB_READ_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_READ_STATEMENT_TIMEOUT_MS", "60000"))
+
+def _connect_args(url: str, statement_timeout_ms: int) -> dict:
+    """Driver-specific connect arguments that set the session statement_timeout."""
+    if not statement_timeout_ms:
+        return {}
+    if make_url(url).drivername.endswith("asyncpg"):
+        return {"server_settings": {"statement_timeout": str(statement_timeout_ms)}}
+    return {"options": f"-c statement_timeout={statement_timeout_ms}"}
+
+# Backoff while waiting for the database at startup: delay doubles from the initial value up to the cap
+DB_CONNECT_MAX_RETRIES = int(os.getenv("DB_CONNECT_MAX_RETRIES", "10"))
+DB_CONNECT_RETRY_DELAY = float(os.getenv("DB_CONNECT_RETRY_DELAY", "0.5"))
+DB_CONNECT_MAX_DELAY = float(os.getenv("DB_CONNECT_MAX_DELAY", "8"))
+
+def create_db_engine(url=DATABASE_URL, pool_size=DB_WRITE_POOL_SIZE, max_overflow=DB_WRITE_MAX_OVERFLOW,
+                     statement_timeout_ms=DB_WRITE_STATEMENT_TIMEOUT_MS):
+    """Create a database engine; no connection is opened until it is first used"""
+    return create_engine(
+        url,
+        pool_pre_ping=True,  # Test connections before using them
+        pool_recycle=300,    # Recycle connections after 5 minutes
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        connect_args=_connect_args(url, statement_timeout_ms),
+    )
+
+def _ping(db_engine):
+    with db_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+async def wait_for_database(max_retries=None, retry_delay=None):
+    """
+    Wait until the primary accepts connections, with exponential backoff.
+
+    The checks run in a worker thread and the waits are asyncio sleeps, so
+    the event loop stays responsive while the database comes up.
+    """
+    max_retries = max_retries or DB_CONNECT_MAX_RETRIES
+    delay = retry_delay or DB_CONNECT_RETRY_DELAY
     for attempt in range(max_retries):
         try:
-            engine = create_engine(
-                DATABASE_URL,
-                pool_pre_ping=True,  # Test connections before using them
-                pool_recycle=300,    # Recycle connections after 5 minutes
-            )
-            # Test the connection
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            logger.info("Database connection successful")
-            return engine
+            await asyncio.to_thread(_ping, engine)
+            logger.info(f"Database connection successful ({make_url(DATABASE_URL).host or 'local'}/{make_url(DATABASE_URL).database})")
+            return
         except OperationalError as e:
             if attempt < max_retries - 1:
                 logger.warning(f"Database connection failed (attempt {attempt + 1}/{max_retries}): {e}")
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+                logger.info(f"Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, DB_CONNECT_MAX_DELAY)
             else:
                 logger.error(f"Failed to connect to database after {max_retries} attempts: {e}")
                 raise
 
+# Writer: the primary
 engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Reader: its own pool even without a replica, so long scans and exports do not starve ingest
+read_engine = create_db_engine(DATABASE_READ_URL, DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW, DB_READ_STATEMENT_TIMEOUT_MS)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Connections are opened lazily, on the event loop that first uses the engine
+async_read_engine = create_async_engine(
+    ASYNC_DATABASE_READ_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    pool_size=DB_READ_POOL_SIZE,
+    max_overflow=DB_READ_MAX_OVERFLOW,
+    connect_args=_connect_args(ASYNC_DATABASE_READ_URL, DB_READ_STATEMENT_TIMEOUT_MS),
+)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, expire_on_commit=False)
+
+def pool_stats():
+    """Checked-out/idle connection counts per engine, for the health endpoint."""
+    return {
+        "writer": engine.pool.status(),
+        "reader": read_engine.pool.status(),
+        "async_reader": async_read_engine.pool.status(),
+        "replica": DATABASE_READ_URL != DATABASE_URL,
+    }
@@ -1,25 +1,48 @@
+from sqlalchemy import or_, select, text, tuple_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from db.models import Transaction
+from db.rollups import apply_inserted_transactions
+from db.data_version import bump_data_version
+from db.partitioning import ensure_partitions
+from db.raw_data import RAW_DATA_MODE, raw_data_for
+from db.fingerprints import FINGERPRINT_CONSTRAINT, dedupe_batch, new_fingerprint_mask, transaction_fingerprint
 from datetime import datetime
+import base64
+import binascii
+import csv
+import io
+import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Rows per multi-row INSERT statement in the bulk ingest path
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+
 def insert_transaction(db: Session, tx: dict):
     """
     Insert a transaction, handling duplicates gracefully.
-    If a duplicate exists (same date, description, amount), skip insertion.
+    If a duplicate exists (same date and fingerprint), skip insertion.
     """
     try:
+        tx_date = datetime.strptime(tx["date"], "%Y-%m-%d").date()
+        ensure_partitions(db, [tx_date])
+        bump_data_version(db)
         transaction = Transaction(
-            date=datetime.strptime(tx["date"], "%Y-%m-%d").date(),
+            date=tx_date,
             description=tx["description"],
             amount=tx["amount"],
             category=tx.get("category", "Uncategorized"),
-            raw_data=tx,
+            raw_data=raw_data_for(tx),
+            fingerprint=transaction_fingerprint(tx_date, tx["description"], tx["amount"]),
         )
         db.add(transaction)
+        db.flush()
+        apply_inserted_transactions(db, [transaction.id])
         db.commit()
         db.refresh(transaction)
         return transaction
@@ -30,17 +53,250 @@ def insert_transaction(db: Session, tx: dict):
         logger.info(f"Duplicate transaction skipped - date: {tx.get('date', 'unknown')}, category: {tx.get('category', 'unknown')}")
         return None
 
-def insert_transactions_batch(db: Session, transactions: list):
+def _transaction_row(tx: dict) -> dict:
+    """Convert an incoming transaction dict into a column mapping for INSERT."""
+    tx_date = datetime.strptime(tx["date"], "%Y-%m-%d").date()
+    return {
+        "date": tx_date,
+        "description": tx["description"],
+        "amount": tx["amount"],
+        "category": tx.get("category", "Uncategorized"),
+        "raw_data": raw_data_for(tx),
+        "fingerprint": transaction_fingerprint(tx_date, tx["description"], tx["amount"]),
+    }
+
+def bulk_insert_transactions(db: Session, transactions: list, batch_size: int = None) -> dict:
+    """
+    Insert transactions with multi-row INSERT ... ON CONFLICT DO NOTHING statements.
+
+    All batches, and the rollup update for the inserted rows, are written
+    in a single database transaction. Duplicates (same date and fingerprint)
+    are dropped in memory against the stored fingerprints of the batch's
+    date range; any that race in are skipped by Postgres instead of raising
+    IntegrityError, so no per-row round trips or rollbacks happen.
+
+    Returns a dict with "inserted" and "skipped" counts and the inserted "ids".
+    """
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    inserted_ids = []
+
+    # One cached statement executed "insertmanyvalues"-style: SQLAlchemy renders
+    # batch_size rows per multi-row VALUES round trip
+    stmt = (
+        pg_insert(Transaction)
+        .on_conflict_do_nothing(constraint=FINGERPRINT_CONSTRAINT)
+        .returning(Transaction.id)
+        .execution_options(insertmanyvalues_page_size=batch_size)
+    )
+
+    rows = [_transaction_row(tx) for tx in transactions]
+    # Before any read of transactions: creating a partition waits for every lock on the parent,
+    # including the one this session's fingerprint lookup would hold
+    ensure_partitions(db, {row["date"] for row in rows})
+    rows = dedupe_batch(db, rows)
+    if not rows:
+        db.rollback()
+        logger.info(f"Duplicate transactions skipped: {len(transactions)}")
+        return {"inserted": 0, "skipped": len(transactions), "ids": []}
+    try:
+        bump_data_version(db)
+        for start in range(0, len(rows), batch_size):
+            inserted_ids.extend(db.execute(stmt, rows[start:start + batch_size]).scalars())
+        apply_inserted_transactions(db, inserted_ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    inserted_count = len(inserted_ids)
+    skipped_count = len(transactions) - inserted_count
+    if skipped_count:
+        logger.info(f"Duplicate transactions skipped: {skipped_count}")
+    return {"inserted": inserted_count, "skipped": skipped_count, "ids": inserted_ids}
+
+_STAGING_TABLE_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS transactions_staging (
+        date date,
+        description varchar,
+        amount double precision,
+        category varchar,
+        fingerprint bigint
+    ) ON COMMIT DELETE ROWS
+"""
+
+# Column batches carry no fields beyond the columns, so raw_data is only filled in "full" mode
+_STAGING_RAW_DATA = """
+    jsonb_build_object('date', to_char(date, 'YYYY-MM-DD'), 'description', description,
+                       'amount', amount, 'category', category)
+""" if RAW_DATA_MODE == "full" else "NULL::jsonb"
+
+_MERGE_STAGING_SQL = f"""
+    INSERT INTO transactions (date, description, amount, category, raw_data, fingerprint)
+    SELECT date, description, amount, category, {_STAGING_RAW_DATA}, fingerprint
+    FROM transactions_staging
+    ON CONFLICT ON CONSTRAINT unique_transaction_fingerprint DO NOTHING
+    RETURNING id
+"""
+
+def bulk_insert_frame(db: Session, frame) -> dict:
     """
-    Insert multiple transactions efficiently, handling duplicates.
-    Returns count of successfully inserted transactions.
+    Insert a column batch (DataFrame with date, description, amount, category)
+    by COPYing it into a session-local staging table and merging from there.
+
+    No Python object is built per row: the frame is encoded as CSV in one
+    vectorized call and streamed to Postgres with COPY. The batch and its
+    rollup update are committed as a single transaction.
+
+    Returns a dict with "inserted" and "skipped" counts and the inserted "ids".
     """
-    inserted_count = 0
-    for tx in transactions:
-        result = insert_transaction(db, tx)
-        if result:
-            inserted_count += 1
-    return inserted_count
+    if frame.empty:
+        return {"inserted": 0, "skipped": 0, "ids": []}
+
+    dates = frame["date"].dt.date.tolist()
+    # Before the fingerprint lookup, see bulk_insert_transactions
+    ensure_partitions(db, set(dates))
+    fingerprints = [transaction_fingerprint(*values) for values in zip(dates, frame["description"], frame["amount"])]
+    mask = new_fingerprint_mask(db, dates, fingerprints)
+    new_rows = frame.assign(fingerprint=fingerprints)[mask]
+    if new_rows.empty:
+        db.rollback()
+        return {"inserted": 0, "skipped": len(frame), "ids": []}
+
+    buffer = io.StringIO()
+    new_rows[["date", "description", "amount", "category", "fingerprint"]].to_csv(
+        buffer, index=False, header=False, date_format="%Y-%m-%d", quoting=csv.QUOTE_NONNUMERIC
+    )
+    buffer.seek(0)
+
+    try:
+        db.execute(text(_STAGING_TABLE_DDL))
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert("COPY transactions_staging FROM STDIN WITH (FORMAT csv, FORCE_NULL (category))", buffer)
+        finally:
+            cursor.close()
+        bump_data_version(db)
+        inserted_ids = db.execute(text(_MERGE_STAGING_SQL)).scalars().all()
+        apply_inserted_transactions(db, inserted_ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {"inserted": len(inserted_ids), "skipped": len(frame) - len(inserted_ids), "ids": inserted_ids}
+
+# Sort option -> (column, descending); every sort is a keyset on (column, id)
+TRANSACTION_SORTS = {
+    "date_desc": (Transaction.date, True),
+    "date_asc": (Transaction.date, False),
+    "amount_desc": (Transaction.amount, True),
+    "amount_asc": (Transaction.amount, False),
+}
+
+def encode_cursor(sort: str, key, row_id: int) -> str:
+    """Opaque cursor pointing just past the row with (key, row_id) in the given sort order."""
+    if hasattr(key, "isoformat"):
+        key = key.isoformat()
+    payload = json.dumps({"s": sort, "k": key, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, sort: str):
+    """Return (key, id) from a cursor; raises ValueError if it is malformed or from another sort order."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        key, row_id = payload["k"], int(payload["id"])
+        if payload["s"] != sort:
+            raise ValueError("cursor was issued for a different sort order")
+        if sort.startswith("date_"):
+            key = datetime.strptime(key, "%Y-%m-%d").date()
+        else:
+            key = float(key)
+    except (KeyError, TypeError, json.JSONDecodeError, binascii.Error) as e:
+        raise ValueError(f"invalid cursor: {e}")
+    return key, row_id
+
+def _transactions_page_query(limit: int, cursor: str, sort: str, start_date, end_date, category: str,
+                             min_amount: float, max_amount: float, sign: str):
+    """Build the keyset page SELECT (one extra row tells whether a next page exists)."""
+    if sort not in TRANSACTION_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(TRANSACTION_SORTS)}")
+    column, descending = TRANSACTION_SORTS[sort]
+
+    query = select(Transaction.id, Transaction.date, Transaction.description, Transaction.amount, Transaction.category)
+    if start_date is not None:
+        query = query.where(Transaction.date >= start_date)
+    if end_date is not None:
+        query = query.where(Transaction.date <= end_date)
+    if category == "Uncategorized":
+        query = query.where(or_(Transaction.category == category, Transaction.category.is_(None)))
+    elif category is not None:
+        query = query.where(Transaction.category == category)
+    if min_amount is not None:
+        query = query.where(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        query = query.where(Transaction.amount <= max_amount)
+    if sign == "income":
+        query = query.where(Transaction.amount > 0)
+    elif sign == "expense":
+        query = query.where(Transaction.amount < 0)
+    elif sign is not None:
+        raise ValueError("sign must be 'income' or 'expense'")
+
+    if cursor:
+        key, row_id = decode_cursor(cursor, sort)
+        position = tuple_(column, Transaction.id)
+        query = query.where(position < tuple_(key, row_id) if descending else position > tuple_(key, row_id))
+        if column is Transaction.date:
+            # Redundant with the row comparison, but lets the planner prune monthly partitions
+            query = query.where(column <= key if descending else column >= key)
+
+    order = (column.desc(), Transaction.id.desc()) if descending else (column.asc(), Transaction.id.asc())
+    return query.order_by(*order).limit(limit + 1)
+
+def _transactions_page(rows, limit: int, sort: str) -> dict:
+    """Shape up to limit + 1 fetched rows into a page with its next cursor."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, last.date if sort.startswith("date_") else last.amount, last.id)
+
+    transactions = [{
+        "id": row.id,
+        "date": row.date.isoformat(),
+        "description": row.description,
+        "amount": row.amount,
+        "category": row.category
+    } for row in rows]
+    return {"transactions": transactions, "next_cursor": next_cursor, "count": len(transactions)}
+
+async def alist_transactions(db: AsyncSession, limit: int = 50, cursor: str = None, sort: str = "date_desc",
+                             start_date=None, end_date=None, category: str = None,
+                             min_amount: float = None, max_amount: float = None, sign: str = None) -> dict:
+    """
+    Return one page of transactions using keyset pagination.
+
+    Rows are ordered by (sort column, id) and the page starts after the
+    cursor position, so the cost depends on the page size rather than on
+    how deep the page is.
+
+    Args:
+        limit: Page size
+        cursor: next_cursor of the previous page
+        sort: One of TRANSACTION_SORTS
+        start_date, end_date: Inclusive date range
+        category: Exact category ("Uncategorized" also matches rows without one)
+        min_amount, max_amount: Inclusive amount range
+        sign: "income" (amount > 0) or "expense" (amount < 0)
+
+    Returns:
+        {"transactions": [...], "next_cursor": str or None, "count": int}
+
+    Raises:
+        ValueError: On an unknown sort, sign or malformed cursor
+    """
+    query = _transactions_page_query(limit, cursor, sort, start_date, end_date, category, min_amount, max_amount, sign)
+    return _transactions_page((await db.execute(query)).all(), limit, sort)
 
 def get_db():
     from config import SessionLocal
@@ -49,3 +305,26 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Session on the reader (replica, or the primary's read pool); for read-only endpoints."""
+    from config import ReadSessionLocal
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def run_with_read_session(func, *args):
+    """Call func(db, *args) with a fresh reader session; for read work handed to a thread pool."""
+    from config import ReadSessionLocal
+    db = ReadSessionLocal()
+    try:
+        return func(db, *args)
+    finally:
+        db.close()
+
+async def get_async_read_db():
+    from config import AsyncReadSessionLocal
+    async with AsyncReadSessionLocal() as db:
+        yield db
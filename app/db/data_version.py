@@ -0,0 +1,42 @@
+"""
+Data version of the transactions table.
+
+Every write bumps data_version.version inside its own transaction. The bump
+takes the row lock before any row is inserted, so writers are serialized and
+transaction ids become visible in increasing order: a reader that has seen
+every id up to N only needs rows with id > N to catch up. Writes that delete
+or edit rows also set reset_version, telling readers to reload.
+"""
+from typing import Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+_READ_SQL = "SELECT version, reset_version FROM data_version WHERE id = 1"
+
+_BUMP_SQL = """
+    INSERT INTO data_version (id, version, reset_version) VALUES (1, 1, CASE WHEN :reset THEN 1 ELSE 0 END)
+    ON CONFLICT (id) DO UPDATE SET
+        version = data_version.version + 1,
+        reset_version = CASE WHEN :reset THEN data_version.version + 1 ELSE data_version.reset_version END
+    RETURNING version
+"""
+
+def bump_data_version(db: Session, reset: bool = False) -> int:
+    """
+    Bump the version inside the caller's transaction (no commit) and return it.
+
+    Call before writing rows; pass reset=True when rows are deleted or modified.
+    """
+    return db.execute(text(_BUMP_SQL), {"reset": reset}).scalar()
+
+def read_data_version(db: Session) -> Tuple[int, int]:
+    """Return (version, reset_version); (0, 0) before the first write."""
+    row = db.execute(text(_READ_SQL)).first()
+    return (row[0], row[1]) if row else (0, 0)
+
+async def aread_data_version(db: AsyncSession) -> Tuple[int, int]:
+    """Async variant of read_data_version."""
+    row = (await db.execute(text(_READ_SQL))).first()
+    return (row[0], row[1]) if row else (0, 0)
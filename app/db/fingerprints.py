@@ -0,0 +1,231 @@
+"""
+Fixed-width fingerprints used to deduplicate transactions.
+
+A fingerprint is a signed 64-bit BLAKE2b hash of the date, the description
+(case-folded, whitespace collapsed) and the amount in cents. The unique
+constraint on (date, fingerprint) replaces the old one on the full
+(date, description, amount) text, so the index stores 12-byte keys, and rows
+that differ only in case or spacing count as duplicates.
+
+Databases created before fingerprints are converted by schema migration 2
+(see ensure_fingerprints and db/migrations.py) or by hand:
+
+    cd app && python -m db.fingerprints
+
+Rows that collide once fingerprinted are flagged, never deleted, by the
+conversion; deleting them is a separate explicit step (--delete-duplicates).
+"""
+import hashlib
+import logging
+from datetime import date
+from typing import Iterable, List, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_CONSTRAINT = "unique_transaction_fingerprint"
+
+# Rows fingerprinted per UPDATE when backfilling
+_BACKFILL_BATCH_SIZE = 10_000
+
+def normalize_for_fingerprint(description: str) -> str:
+    return " ".join(str(description).casefold().split())
+
+def transaction_fingerprint(tx_date: date, description: str, amount: float) -> int:
+    key = f"{tx_date.isoformat()}|{normalize_for_fingerprint(description)}|{round(float(amount), 2):.2f}"
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+def existing_fingerprints(db: Session, fingerprints: List[int], start: date, end: date) -> Set[int]:
+    """
+    Fingerprints among the given ones that are already stored between start and end.
+
+    The date window keeps the lookup on the (date, fingerprint) index and,
+    on a partitioned table, on the affected months only.
+    """
+    if not fingerprints:
+        return set()
+    return set(db.execute(
+        text("SELECT fingerprint FROM transactions WHERE date BETWEEN :start AND :end AND fingerprint = ANY(:fingerprints)"),
+        {"start": start, "end": end, "fingerprints": list(fingerprints)},
+    ).scalars())
+
+def new_fingerprint_mask(db: Session, dates: List[date], fingerprints: List[int]) -> List[bool]:
+    """
+    For each row of an insert batch, whether it is new: not stored yet and
+    not a repeat of an earlier row of the same batch.
+
+    Saves the database from inserting, then discarding, rows that would hit
+    the unique constraint (re-uploaded statements are mostly duplicates).
+    The constraint still settles races with concurrent writers.
+    """
+    if not fingerprints:
+        return []
+    seen = existing_fingerprints(db, fingerprints, min(dates), max(dates))
+    mask = []
+    for fingerprint in fingerprints:
+        mask.append(fingerprint not in seen)
+        seen.add(fingerprint)
+    return mask
+
+def dedupe_batch(db: Session, rows: List[dict]) -> List[dict]:
+    """new_fingerprint_mask applied to row dicts with "date" and "fingerprint" keys."""
+    mask = new_fingerprint_mask(db, [row["date"] for row in rows], [row["fingerprint"] for row in rows])
+    return [row for row, keep in zip(rows, mask) if keep]
+
+def _fingerprint_rows(rows: Iterable) -> List[dict]:
+    return [{"id": row.id, "fingerprint": transaction_fingerprint(row.date, row.description, row.amount)} for row in rows]
+
+def backfill_fingerprints(db: Session) -> int:
+    """Fingerprint rows that have none, in id order and batches; returns the number updated."""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            text("SELECT id, date, description, amount FROM transactions "
+                 "WHERE fingerprint IS NULL AND id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": _BACKFILL_BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+        fingerprinted = _fingerprint_rows(rows)
+        db.execute(
+            text("UPDATE transactions t SET fingerprint = v.fingerprint "
+                 "FROM unnest(CAST(:ids AS integer[]), CAST(:fingerprints AS bigint[])) AS v(id, fingerprint) "
+                 "WHERE t.id = v.id"),
+            {"ids": [row["id"] for row in fingerprinted], "fingerprints": [row["fingerprint"] for row in fingerprinted]},
+        )
+        db.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+    return updated
+
+def _constraint_exists(db: Session, name: str) -> bool:
+    return bool(db.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'transactions'::regclass AND conname = :name)"),
+        {"name": name},
+    ).scalar())
+
+class FingerprintCollisionError(Exception):
+    """Stored rows collide on (date, fingerprint), so the fingerprint constraint cannot be created."""
+
+_COLLISIONS_SQL = """
+    SELECT t.id, min(d.id) FROM transactions t JOIN transactions d
+      ON t.date = d.date AND t.fingerprint = d.fingerprint AND t.id > d.id
+    GROUP BY t.id
+"""
+
+def ensure_candidate_kinds(db: Session):
+    """
+    Add duplicate_candidates.kind to older databases (idempotent).
+
+    Existing flags of two rows with the same fingerprint are collision flags
+    from an earlier ensure_fingerprints run and become kind 'fingerprint'.
+    """
+    db.execute(text("ALTER TABLE duplicate_candidates ADD COLUMN IF NOT EXISTS kind VARCHAR(16) NOT NULL DEFAULT 'near'"))
+    db.execute(text(
+        "UPDATE duplicate_candidates c SET kind = 'fingerprint' FROM transactions t, transactions d "
+        "WHERE c.kind = 'near' AND c.similarity = 1.0 AND t.id = c.transaction_id AND d.id = c.duplicate_of_id "
+        "AND t.date = d.date AND t.fingerprint = d.fingerprint"
+    ))
+    db.commit()
+
+def _swap_constraints(db: Session):
+    db.execute(text(f"ALTER TABLE transactions ADD CONSTRAINT {FINGERPRINT_CONSTRAINT} UNIQUE (date, fingerprint)"))
+    db.execute(text("ALTER TABLE transactions DROP CONSTRAINT IF EXISTS unique_transaction"))
+    # The constraint now rules collisions out, so their flags are resolved
+    db.execute(text("DELETE FROM duplicate_candidates WHERE kind = 'fingerprint'"))
+
+def ensure_fingerprints(db: Session):
+    """
+    Bring an older database onto fingerprint deduplication (idempotent).
+
+    Adds and backfills the column, then swaps unique_transaction for the
+    fingerprint constraint. No row is ever deleted here: if stored rows only
+    differ from an earlier one in case or spacing, the pairs are flagged in
+    duplicate_candidates (kind 'fingerprint', see GET /duplicates) and
+    FingerprintCollisionError is raised, leaving the old constraint in place
+    until they are resolved by hand or removed with:
+
+        cd app && python -m db.fingerprints --delete-duplicates
+    """
+    if _constraint_exists(db, FINGERPRINT_CONSTRAINT):
+        return
+    db.execute(text("ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fingerprint BIGINT"))
+    db.commit()
+    backfilled = backfill_fingerprints(db)
+    ensure_candidate_kinds(db)
+
+    try:
+        collisions = db.execute(text(_COLLISIONS_SQL)).all()
+        if collisions:
+            # Imported here: db.models is not needed by the ingest-time helpers above
+            from sqlalchemy.dialects.postgresql import insert as pg_insert
+            from db.models import DuplicateCandidate
+            db.execute(
+                pg_insert(DuplicateCandidate).on_conflict_do_nothing(),
+                [{"transaction_id": newer, "duplicate_of_id": older, "similarity": 1.0, "kind": "fingerprint"}
+                 for newer, older in collisions],
+            )
+            db.commit()
+            raise FingerprintCollisionError(
+                f"{len(collisions)} transactions repeat an earlier one up to case or spacing; "
+                "they are flagged in duplicate_candidates. Resolve them, or delete them with "
+                "`python -m db.fingerprints --delete-duplicates`, then restart"
+            )
+        _swap_constraints(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"Fingerprinted {backfilled} transactions")
+
+def delete_fingerprint_duplicates(db: Session) -> int:
+    """
+    Delete the rows that collide with an earlier one on (date, fingerprint),
+    create the fingerprint constraint and rebuild the rollups.
+
+    Destructive; only run explicitly. Returns the number of rows deleted.
+    """
+    from db.rollups import rebuild_rollups
+
+    if _constraint_exists(db, FINGERPRINT_CONSTRAINT):
+        return 0
+    db.execute(text("ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fingerprint BIGINT"))
+    db.commit()
+    backfill_fingerprints(db)
+    ensure_candidate_kinds(db)
+    try:
+        deleted = db.execute(text(
+            "DELETE FROM transactions t USING transactions d "
+            "WHERE t.date = d.date AND t.fingerprint = d.fingerprint AND t.id > d.id"
+        )).rowcount
+        _swap_constraints(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if deleted:
+        rebuild_rollups(db)
+    logger.info(f"Deleted {deleted} transactions that repeated an earlier one up to case or spacing")
+    return deleted
+
+if __name__ == "__main__":
+    import argparse
+    from config import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Convert transactions to fingerprint deduplication")
+    parser.add_argument("--delete-duplicates", action="store_true",
+                        help="delete rows that only differ from an earlier one in case or spacing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        if args.delete_duplicates:
+            print(f"Deleted {delete_fingerprint_duplicates(session)} duplicate transactions")
+        else:
+            ensure_fingerprints(session)
+    finally:
+        session.close()
@@ -0,0 +1,104 @@
+"""
+Versioned schema migrations.
+
+Applied versions are recorded in schema_migrations, so a process that
+starts against an up-to-date database only runs one small query instead
+of create_all, an index check per index and the backfill probes. Pending
+migrations run in version order, at startup (MIGRATE_ON_STARTUP, on by
+default) or by hand before a deploy:
+
+    cd app && python -m db.migrations
+
+Each step must be idempotent: databases that predate schema_migrations run
+every step once, including ones whose effect is already in place. Schema
+changes are added as a new entry at the end of MIGRATIONS, never by editing
+an applied one.
+"""
+import logging
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from db.fingerprints import ensure_candidate_kinds, ensure_fingerprints
+from db.models import Base, SchemaMigration, Transaction
+from db.rollups import ensure_rollups
+
+logger = logging.getLogger(__name__)
+
+# Serializes migrations between processes starting at the same time (arbitrary application-wide key)
+_MIGRATION_LOCK_KEY = 7214025
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Session], None]
+
+def _create_baseline_schema(db: Session):
+    bind = db.get_bind()
+    Base.metadata.create_all(bind=bind)
+    # create_all skips indexes of tables that already exist
+    for index in Transaction.__table__.indexes:
+        index.create(bind=bind, checkfirst=True)
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline schema", _create_baseline_schema),
+    Migration(2, "transaction fingerprints", ensure_fingerprints),
+    Migration(3, "rollup backfill", ensure_rollups),
+    Migration(4, "duplicate candidate kinds", ensure_candidate_kinds),
+]
+
+def current_version(db: Session) -> int:
+    """Highest applied version, 0 for a database without schema_migrations."""
+    if not db.execute(text("SELECT to_regclass('schema_migrations') IS NOT NULL")).scalar():
+        return 0
+    return db.execute(text("SELECT coalesce(max(version), 0) FROM schema_migrations")).scalar()
+
+def run_migrations(db: Session) -> int:
+    """
+    Apply pending migrations in order; returns the number applied.
+
+    The common case (nothing pending) is answered without taking the lock.
+    Otherwise a session-level advisory lock, held on a separate connection
+    because the steps commit as they go, makes concurrent starters wait and
+    then find the work done.
+    """
+    latest = MIGRATIONS[-1].version
+    if current_version(db) >= latest:
+        db.commit()
+        return 0
+
+    with db.get_bind().connect() as lock_connection:
+        lock_connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+        lock_connection.commit()
+        try:
+            SchemaMigration.__table__.create(bind=db.get_bind(), checkfirst=True)
+            applied = set(db.execute(select(SchemaMigration.version)).scalars())
+            db.commit()
+            count = 0
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                logger.info(f"Applying schema migration {migration.version}: {migration.name}")
+                migration.apply(db)
+                db.add(SchemaMigration(version=migration.version, name=migration.name))
+                db.commit()
+                count += 1
+            return count
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+            lock_connection.commit()
+
+if __name__ == "__main__":
+    from config import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        applied = run_migrations(session)
+        print(f"Applied {applied} migrations, schema at version {current_version(session)}")
+    finally:
+        session.close()
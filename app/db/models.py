@@ -1,11 +1,15 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Date, Float, Integer, String, JSON, Index, UniqueConstraint
+from sqlalchemy import BigInteger, Date, DateTime, Float, Integer, SmallInteger, String, JSON, Index, UniqueConstraint, func
+from sqlalchemy.dialects.postgresql import JSONB
 from typing import Optional
+from datetime import datetime
 
 class Base(DeclarativeBase):
     pass
 
 class Transaction(Base):
+    # Optionally range-partitioned by month on date (see db/partitioning.py); the
+    # primary key is then (id, date), id stays unique through its sequence
     __tablename__ = "transactions"
 
     # Primary key with implicit index (no need for explicit index=True)
@@ -16,14 +20,108 @@ class Transaction(Base):
     description: Mapped[str] = mapped_column(String)
     amount: Mapped[float] = mapped_column(Float)
     category: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    raw_data: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # Input fields without a column of their own (see db/raw_data.py); NULL if there are none
+    raw_data: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    # 64-bit hash of the normalized date, description and amount (see db/fingerprints.py)
+    fingerprint: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
 
     # Optimized indexes based on actual query patterns
     __table_args__ = (
-        # Prevent duplicate transactions - this is the most important constraint
-        UniqueConstraint('date', 'description', 'amount', name='unique_transaction'),
+        # Prevent duplicate transactions - this is the most important constraint.
+        # Keyed on the fixed-width fingerprint instead of the full description text
+        UniqueConstraint('date', 'fingerprint', name='unique_transaction_fingerprint'),
         
         # Single optimized index for the most common filter: amount < 0 (expenses)
         # This supports the primary query pattern in insights.py
         Index('idx_amount_date', 'amount', 'date'),  # Supports filtering by amount with date ordering
+
+        # Keyset pagination of /transactions: (sort column, id) per sort option,
+        # plus category-filtered date paging
+        Index('idx_date_id', 'date', 'id'),
+        Index('idx_amount_id', 'amount', 'id'),
+        Index('idx_category_date_id', 'category', 'date', 'id'),
+    )
+
+class TransactionRollup(Base):
+    """Per (month, category, sign) aggregates of transactions, maintained at ingest (see db/rollups.py)."""
+    __tablename__ = "transaction_rollups"
+
+    # First day of the month
+    month: Mapped[Date] = mapped_column(Date, primary_key=True)
+    # COALESCE(category, 'Uncategorized')
+    category: Mapped[str] = mapped_column(String, primary_key=True)
+    # sign(amount): 1 income, -1 expense, 0 zero amount
+    sign: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    total: Mapped[float] = mapped_column(Float)
+    count: Mapped[int] = mapped_column(Integer)
+    min_amount: Mapped[float] = mapped_column(Float)
+    max_amount: Mapped[float] = mapped_column(Float)
+
+class DataVersion(Base):
+    """Single-row counter bumped by every write to transactions (see db/data_version.py)."""
+    __tablename__ = "data_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
+    # Version of the last write that was not a pure append (rows deleted or edited)
+    reset_version: Mapped[int] = mapped_column(BigInteger, default=0)
+
+class ProcessedFile(Base):
+    """Content-addressed registry of uploaded statements and their extracted transactions."""
+    __tablename__ = "processed_files"
+
+    # SHA-256 hex digest of the uploaded bytes
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    kind: Mapped[str] = mapped_column(String)
+    filename: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    size_bytes: Mapped[int] = mapped_column(Integer)
+    transaction_count: Mapped[int] = mapped_column(Integer)
+    transactions: Mapped[list] = mapped_column(JSON)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        # Supports least-recently-used eviction
+        Index('idx_processed_files_last_used', 'last_used_at'),
     )
+
+class MerchantRule(Base):
+    """Merchant/keyword rule mapping transaction descriptions to a category."""
+    __tablename__ = "merchant_rules"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Normalized description ("exact") or keyword phrase ("keyword")
+    pattern: Mapped[str] = mapped_column(String)
+    match_type: Mapped[str] = mapped_column(String)
+    category: Mapped[str] = mapped_column(String)
+    # "manual", "learned" (from categorized transactions) or "llm"
+    source: Mapped[str] = mapped_column(String)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('pattern', 'match_type', name='unique_merchant_rule'),
+    )
+
+class DuplicateCandidate(Base):
+    """Pair of transactions flagged as likely the same payment (see services/duplicates.py)."""
+    __tablename__ = "duplicate_candidates"
+
+    # The newer row of the pair
+    transaction_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # The earlier row it probably repeats
+    duplicate_of_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Trigram (Jaccard) similarity of the normalized descriptions
+    similarity: Mapped[float] = mapped_column(Float)
+    # "near": found by duplicate detection, replaced by every full scan;
+    # "fingerprint": collision flagged by the fingerprint migration, kept until resolved
+    kind: Mapped[str] = mapped_column(String(16), default="near", server_default="near")
+    detected_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+class SchemaMigration(Base):
+    """Applied schema migration (see db/migrations.py)."""
+    __tablename__ = "schema_migrations"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -0,0 +1,171 @@
+"""
+Opt-in monthly range partitioning of transactions on date.
+
+Converting an existing database rewrites the table into one partition per
+month, keeping ids, the id sequence, the fingerprint constraint and
+the indexes (the primary key becomes (id, date), as Postgres requires the
+partition key in every unique constraint):
+
+    cd app && python -m db.partitioning --months-ahead 3
+
+The conversion holds an exclusive lock on transactions while rows are
+copied, so ingest waits and readers keep the old table until the commit.
+Afterwards ingest creates the partitions for the months it writes to (see
+ensure_partitions); queries bounded on date only touch the matching months.
+"""
+import argparse
+import logging
+from datetime import date
+from typing import Iterable, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from db.fingerprints import ensure_fingerprints
+
+logger = logging.getLogger(__name__)
+
+# Serializes partition DDL between processes (arbitrary application-wide key)
+_PARTITION_LOCK_KEY = 7214021
+
+# Months known to have a partition in this process; None until loaded
+_known_months: Set[date] = None
+_partitioned = False
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"transactions_p{month.year:04d}_{month.month:02d}"
+
+def _create_partition_sql(month: date, parent: str = "transactions") -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {parent} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+    )
+
+def is_partitioned(db: Session) -> bool:
+    """Whether transactions is a partitioned table (cached once true: the conversion is one-way)."""
+    global _partitioned
+    if not _partitioned:
+        _partitioned = bool(db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('transactions'))"
+        )).scalar())
+    return _partitioned
+
+def _existing_months(connection) -> Set[date]:
+    names = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'transactions'::regclass"
+    )).scalars()
+    months = set()
+    for name in names:
+        year, month = name.rsplit("_p", 1)[-1].split("_")
+        months.add(date(int(year), int(month), 1))
+    return months
+
+def ensure_partitions(db: Session, months: Iterable) -> int:
+    """
+    Create the monthly partitions covering the given dates, if the table is partitioned.
+
+    Missing partitions are created on a separate connection and committed
+    right away: CREATE TABLE ... PARTITION OF locks the parent table, and
+    doing it inside the ingest transaction would hold that lock (blocking
+    readers) until the whole batch commits. Call before writing the rows.
+
+    Returns the number of partitions created.
+    """
+    global _known_months
+    if not is_partitioned(db):
+        return 0
+    wanted = {_month_start(value) for value in months}
+    if not wanted or (_known_months is not None and wanted <= _known_months):
+        return 0
+
+    with db.get_bind().begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PARTITION_LOCK_KEY})
+        _known_months = _existing_months(connection)
+        missing = sorted(wanted - _known_months)
+        for month in missing:
+            connection.execute(text(_create_partition_sql(month)))
+    _known_months |= set(missing)
+    if missing:
+        logger.info(f"Created transaction partitions: {', '.join(partition_name(m) for m in missing)}")
+    return len(missing)
+
+_INDEX_SQL = [
+    "ALTER TABLE transactions ADD CONSTRAINT transactions_pkey PRIMARY KEY (id, date)",
+    "ALTER TABLE transactions ADD CONSTRAINT unique_transaction_fingerprint UNIQUE (date, fingerprint)",
+    "CREATE INDEX idx_amount_date ON transactions (amount, date)",
+    "CREATE INDEX idx_date_id ON transactions (date, id)",
+    "CREATE INDEX idx_amount_id ON transactions (amount, id)",
+    "CREATE INDEX idx_category_date_id ON transactions (category, date, id)",
+]
+
+def migrate_to_partitioned(db: Session, months_ahead: int = 3) -> int:
+    """
+    Rewrite transactions as a partitioned table with one partition per month
+    from the oldest transaction up to months_ahead months past today.
+
+    Runs in a single transaction; returns the number of partitions created,
+    or 0 if the table is already partitioned.
+    """
+    if is_partitioned(db):
+        logger.info("transactions is already partitioned")
+        return 0
+    ensure_fingerprints(db)
+
+    try:
+        db.execute(text("LOCK TABLE transactions IN EXCLUSIVE MODE"))
+        oldest = db.execute(text("SELECT min(date) FROM transactions")).scalar()
+        month = _month_start(oldest or date.today())
+        last = _month_start(date.today())
+        for _ in range(months_ahead):
+            last = _next_month(last)
+        newest = db.execute(text("SELECT max(date) FROM transactions")).scalar()
+        if newest is not None:
+            last = max(last, _month_start(newest))
+
+        # LIKE ... INCLUDING DEFAULTS keeps nextval('transactions_id_seq') as the id default
+        db.execute(text("CREATE TABLE transactions_partitioned (LIKE transactions INCLUDING DEFAULTS) PARTITION BY RANGE (date)"))
+        db.execute(text("ALTER TABLE transactions_partitioned ALTER COLUMN date SET NOT NULL"))
+        created = 0
+        while month <= last:
+            db.execute(text(_create_partition_sql(month, parent="transactions_partitioned")))
+            month = _next_month(month)
+            created += 1
+
+        copied = db.execute(text("INSERT INTO transactions_partitioned SELECT * FROM transactions")).rowcount
+        # The sequence is owned by the old id column and would be dropped with it
+        db.execute(text("ALTER SEQUENCE transactions_id_seq OWNED BY NONE"))
+        db.execute(text("DROP TABLE transactions"))
+        db.execute(text("ALTER TABLE transactions_partitioned RENAME TO transactions"))
+        db.execute(text("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id"))
+        for statement in _INDEX_SQL:
+            db.execute(text(statement))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    db.execute(text("ANALYZE transactions"))
+    db.commit()
+    logger.info(f"Partitioned transactions: {copied} rows in {created} monthly partitions")
+    return created
+
+if __name__ == "__main__":
+    from config import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Convert transactions to monthly range partitions")
+    parser.add_argument("--months-ahead", type=int, default=3, help="empty partitions to create past the current month")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        print(f"Created {migrate_to_partitioned(session, args.months_ahead)} partitions")
+    finally:
+        session.close()
@@ -0,0 +1,104 @@
+"""
+What transactions.raw_data keeps.
+
+By default (RAW_DATA_MODE=extra) raw_data only holds input fields that have
+no column of their own, and is NULL when there are none; RAW_DATA_MODE=full
+keeps the whole input dict as before. Existing rows are slimmed by:
+
+    cd app && python -m db.raw_data
+
+On a database that still has the old json column this converts it to jsonb
+and strips the column fields in a single table rewrite (exclusive lock, no
+dead tuples left behind); on jsonb it updates in batches, which needs a
+VACUUM afterwards before the space is reused.
+"""
+import logging
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# "extra": only fields without a column (default), "full": the whole input dict
+RAW_DATA_MODE = os.getenv("RAW_DATA_MODE", "extra")
+
+# Input keys stored in their own columns
+COLUMN_FIELDS = ("date", "description", "amount", "category")
+
+# Rows updated per statement when slimming an existing jsonb column
+_SLIM_BATCH_SIZE = 50_000
+
+_COLUMN_FIELDS_SQL = "ARRAY[" + ", ".join(f"'{field}'" for field in COLUMN_FIELDS) + "]"
+_SLIM_EXPR = f"NULLIF(raw_data::jsonb - {_COLUMN_FIELDS_SQL}, '{{}}'::jsonb)"
+
+def raw_data_for(tx: dict) -> Optional[dict]:
+    """raw_data to store for an incoming transaction dict under RAW_DATA_MODE."""
+    if RAW_DATA_MODE == "full":
+        return tx
+    extra = {key: value for key, value in tx.items() if key not in COLUMN_FIELDS}
+    return extra or None
+
+def table_stats(db: Session) -> dict:
+    """Heap and total (heap + TOAST + indexes) size of transactions, and a full-scan timing."""
+    heap, total = db.execute(text(
+        "SELECT sum(pg_relation_size(oid)), sum(pg_total_relation_size(oid)) FROM pg_class "
+        "WHERE relkind = 'r' AND (oid = 'transactions'::regclass OR oid IN (SELECT relid FROM pg_partition_tree('transactions')))"
+    )).one()
+    # Best of three, so the figure reflects a cached scan rather than disk reads
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        db.execute(text("SELECT count(*), sum(amount) FROM transactions")).one()
+        timings.append((time.perf_counter() - started) * 1000)
+    scan_ms = min(timings)
+    db.commit()
+    return {"heap_mb": round(int(heap) / 1e6, 1), "total_mb": round(int(total) / 1e6, 1), "scan_ms": round(scan_ms, 1)}
+
+def slim_raw_data(db: Session) -> int:
+    """
+    Strip the column fields from every stored raw_data (and convert json to jsonb).
+
+    Returns the number of rows rewritten.
+    """
+    column_type = db.execute(text(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = 'transactions' AND column_name = 'raw_data'"
+    )).scalar()
+    try:
+        if column_type == "json":
+            count = db.execute(text("SELECT count(*) FROM transactions")).scalar()
+            db.execute(text(f"ALTER TABLE transactions ALTER COLUMN raw_data TYPE jsonb USING {_SLIM_EXPR}"))
+            db.commit()
+            return count
+
+        count = 0
+        last_id = db.execute(text("SELECT coalesce(max(id), 0) FROM transactions")).scalar()
+        for start in range(0, last_id, _SLIM_BATCH_SIZE):
+            count += db.execute(text(
+                f"UPDATE transactions SET raw_data = {_SLIM_EXPR} "
+                f"WHERE id > :start AND id <= :end AND raw_data ?| {_COLUMN_FIELDS_SQL}"
+            ), {"start": start, "end": start + _SLIM_BATCH_SIZE}).rowcount
+            db.commit()
+        return count
+    except Exception:
+        db.rollback()
+        raise
+
+if __name__ == "__main__":
+    from config import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        before = table_stats(session)
+        rewritten = slim_raw_data(session)
+        session.execute(text("ANALYZE transactions"))
+        session.commit()
+        after = table_stats(session)
+        print(f"Slimmed raw_data of {rewritten} rows")
+        print(f"before: {before}")
+        print(f"after:  {after}")
+    finally:
+        session.close()
@@ -0,0 +1,92 @@
+"""
+Rollup maintenance for transaction_rollups.
+
+Ingest (db/crud.py) folds newly inserted rows into the rollups in the same
+database transaction. rebuild_rollups recomputes them from scratch, e.g.
+after a backfill or after rows were deleted or edited by hand:
+
+    cd app && python -m db.rollups
+"""
+import logging
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from db.data_version import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+_ROLLUP_COLUMNS = "month, category, sign, total, count, min_amount, max_amount"
+
+_ROLLUP_SELECT = """
+    SELECT date_trunc('month', date)::date, COALESCE(category, 'Uncategorized'), sign(amount)::smallint,
+           sum(amount), count(*), min(amount), max(amount)
+    FROM {source}
+    GROUP BY 1, 2, 3
+"""
+
+_APPLY_INSERTED_SQL = f"""
+    INSERT INTO transaction_rollups ({_ROLLUP_COLUMNS})
+    {_ROLLUP_SELECT.format(source="transactions WHERE id = ANY(:ids)")}
+    ON CONFLICT (month, category, sign) DO UPDATE SET
+        total = transaction_rollups.total + EXCLUDED.total,
+        count = transaction_rollups.count + EXCLUDED.count,
+        min_amount = LEAST(transaction_rollups.min_amount, EXCLUDED.min_amount),
+        max_amount = GREATEST(transaction_rollups.max_amount, EXCLUDED.max_amount)
+"""
+
+_REBUILD_SQL = f"""
+    INSERT INTO transaction_rollups ({_ROLLUP_COLUMNS})
+    {_ROLLUP_SELECT.format(source="transactions")}
+"""
+
+def apply_inserted_transactions(db: Session, ids: List[int]):
+    """
+    Fold freshly inserted transactions into the rollups.
+
+    Runs inside the caller's transaction and does not commit, so the rows
+    and their aggregates become visible together.
+    """
+    if ids:
+        db.execute(text(_APPLY_INSERTED_SQL), {"ids": list(ids)})
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Recompute all rollups from the transactions table.
+
+    The rollup table is locked for the duration, so concurrent ingests wait
+    and then apply their rows on top of the rebuilt totals. The data version
+    is reset as well, since a rebuild usually follows manual edits.
+
+    Returns the number of rollup rows written.
+    """
+    try:
+        bump_data_version(db, reset=True)
+        db.execute(text("LOCK TABLE transaction_rollups IN EXCLUSIVE MODE"))
+        db.execute(text("DELETE FROM transaction_rollups"))
+        written = db.execute(text(_REBUILD_SQL)).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"Rebuilt {written} transaction rollups")
+    return written
+
+def ensure_rollups(db: Session):
+    """Backfill the rollups once for databases that predate them."""
+    missing = db.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM transactions) AND NOT EXISTS (SELECT 1 FROM transaction_rollups)"
+    )).scalar()
+    if missing:
+        rebuild_rollups(db)
+
+if __name__ == "__main__":
+    from config import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_rollups(session)} rollup rows")
+    finally:
+        session.close()
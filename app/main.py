@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 from fastapi import FastAPI
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -6,9 +7,11 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from contextlib import asynccontextmanager
-from config import engine
-from db.models import Base
+from config import engine, SessionLocal, pool_stats, wait_for_database
+from db.migrations import run_migrations
 from api.routes import router
+from services.jobs import shutdown_workers
+from services.pdf_parser import shutdown_extract_pool
 from utils.secure_logging import setup_secure_logging
 
 # Configure secure logging (replaces basic logging)
@@ -16,6 +19,18 @@ logger = setup_secure_logging()
 
 limiter = Limiter(key_func=get_remote_address)
 
+# Apply pending schema migrations at startup; turn off when they are run as a deploy step
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+def _migrate():
+    db = SessionLocal()
+    try:
+        applied = run_migrations(db)
+    finally:
+        db.close()
+    if applied:
+        logger.info(f"Applied {applied} schema migrations on startup")
+
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
@@ -26,16 +41,26 @@ async def lifespan(app: FastAPI):
     """Handle application startup and shutdown events"""
     # Startup
     if os.getenv("TESTING") != "true":
-        try:
-            Base.metadata.create_all(bind=engine)
-            logger.info("Database tables and indexes created/verified on startup")
-        except Exception as e:
-            logger.warning(f"Could not create tables/indexes on startup: {e}")
+        if MIGRATE_ON_STARTUP:
+            # Ingest depends on the migrated schema (its ON CONFLICT needs the fingerprint
+            # constraint), so the app does not start on a schema it cannot migrate
+            try:
+                await wait_for_database()
+                await asyncio.to_thread(_migrate)
+            except Exception as e:
+                logger.error(f"Could not migrate the database schema on startup: {e}")
+                raise
+        else:
+            try:
+                await wait_for_database()
+            except Exception as e:
+                logger.warning(f"Database not reachable on startup: {e}")
     
     yield
     
-    # Shutdown (if needed)
-    pass
+    # Shutdown: stop background ingestion workers
+    shutdown_workers()
+    shutdown_extract_pool()
 
 app = FastAPI(title="Finance Assistant API", lifespan=lifespan)
 
@@ -68,6 +93,7 @@ def health_check():
             "status": "healthy",
             "database": "connected",
             "tables": tables,
+            "pools": pool_stats(),
             "message": "All systems operational"
         }
     except Exception as e:
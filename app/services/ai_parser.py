@@ -4,69 +4,150 @@
 import os
 import json
 import logging
-from typing import List, Dict, Any
-from openai import AzureOpenAI
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
+from services.llm_gateway import chat_completion, estimate_tokens
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_with_ai(text: str) -> List[Dict[str, Any]]:
+# Description of the placeholder row returned when AI parsing fails
+AI_FALLBACK_DESCRIPTION = "AI Parsing Failed - Fallback Transaction"
+
+def parse_with_ai(text: str, use_cache: bool = True) -> Tuple[List[Dict[str, Any]], bool]:
     """
     Use Azure AI to extract transactions from text
 
     Args:
         text: Raw text content
+        use_cache: Set to False to bypass the LLM response cache
 
     Returns:
-        List of transaction dictionaries
+        (transactions, complete): the transaction dictionaries, and False if
+        any chunk of the text could not be extracted
     """
     logger.info("Starting AI transaction extraction")
 
     try:
-        transactions = extract_transactions_with_ai(text)
+        transactions, failed_chunks = extract_transactions_with_ai(text, use_cache)
         logger.info(f"Successfully extracted {len(transactions)} transactions")
-        return transactions
+        return transactions, failed_chunks == 0
     except Exception as e:
         logger.error(f"AI parsing failed: {e}")
         # Fallback to mock data if AI fails
         return [{
             "date": datetime.now().strftime("%Y-%m-%d"),
-            "description": "AI Parsing Failed - Fallback Transaction",
+            "description": AI_FALLBACK_DESCRIPTION,
             "amount": -123.45,
             "category": "Uncategorized"
-        }]
+        }], False
+
+# Token budget for the statement text in one extraction request
+AI_CHUNK_MAX_TOKENS = int(os.getenv("AI_CHUNK_MAX_TOKENS", "3000"))
+# Lines repeated at the start of the next chunk so no row is cut in half
+AI_CHUNK_OVERLAP_LINES = int(os.getenv("AI_CHUNK_OVERLAP_LINES", "2"))
+# Chunks of one statement submitted at once (the gateway enforces the process-wide limits)
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+
+# Separates pages in text handed to extract_transactions_with_ai
+PAGE_SEPARATOR = "\f"
 
-def extract_transactions_with_ai(text: str) -> List[Dict[str, Any]]:
+def split_statement_text(text: str, max_tokens: int = AI_CHUNK_MAX_TOKENS,
+                         overlap_lines: int = AI_CHUNK_OVERLAP_LINES) -> List[str]:
     """
-    Use Azure AI to extract transactions from text
+    Split statement text into chunks within a token budget.
+
+    Chunks end on page boundaries when possible and otherwise on line
+    boundaries; the last overlap_lines lines of a chunk are repeated at the
+    start of the next one so rows straddling a boundary are seen whole.
 
     Args:
-        text: Raw text content
+        text: Statement text, pages separated by PAGE_SEPARATOR
+        max_tokens: Token budget per chunk
+        overlap_lines: Lines repeated between consecutive chunks
 
     Returns:
-        List of transaction dictionaries
+        List of chunk texts in statement order
     """
-    logger.info("Starting Azure AI transaction extraction")
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    fresh_lines = 0
+
+    def flush():
+        nonlocal current, current_tokens, fresh_lines
+        chunks.append("\n".join(current))
+        current = current[-overlap_lines:] if overlap_lines else []
+        current_tokens = sum(estimate_tokens(line) for line in current)
+        fresh_lines = 0
+
+    for page in text.split(PAGE_SEPARATOR):
+        # Start a new chunk at the page boundary if the whole page does not fit
+        if fresh_lines and current_tokens + estimate_tokens(page) > max_tokens:
+            flush()
+        for line in page.splitlines():
+            line_tokens = estimate_tokens(line)
+            if fresh_lines and current_tokens + line_tokens > max_tokens:
+                flush()
+            current.append(line)
+            current_tokens += line_tokens
+            fresh_lines += 1
+
+    if fresh_lines:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _transaction_key(tx: Dict[str, Any]):
+    return (tx["date"], " ".join(tx["description"].lower().split()), round(tx["amount"], 2))
+
+def merge_chunk_results(chunk_results: List[List[Dict[str, Any]]], overlap_lines: int = AI_CHUNK_OVERLAP_LINES) -> List[Dict[str, Any]]:
+    """
+    Merge per-chunk transactions in order, dropping rows that were extracted
+    twice because they sit in the overlap between consecutive chunks.
 
-    # Initialize Azure OpenAI client
-    client = AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-    )
+    Only the first overlap_lines rows of a chunk are compared against the last
+    overlap_lines rows of the previous chunk, so genuine repeated transactions
+    elsewhere in the statement are kept.
+    """
+    merged: List[Dict[str, Any]] = []
+    previous: List[Dict[str, Any]] = []
+    for transactions in chunk_results:
+        boundary = [_transaction_key(tx) for tx in previous[-overlap_lines:]] if overlap_lines else []
+        for index, tx in enumerate(transactions):
+            key = _transaction_key(tx)
+            if index < overlap_lines and key in boundary:
+                boundary.remove(key)
+                continue
+            merged.append(tx)
+        previous = transactions
+    return merged
+
+def _parse_transaction_array(ai_response: str) -> List[Any]:
+    """Decode the JSON array of an extraction reply; raises ValueError if there is none."""
+    json_start = ai_response.find('[')
+    json_end = ai_response.rfind(']') + 1
+    if json_start == -1 or json_end == 0:
+        raise ValueError("No JSON array found in AI response")
+    transactions = json.loads(ai_response[json_start:json_end])
+    if not isinstance(transactions, list):
+        raise ValueError("AI response is not a JSON array")
+    return transactions
+
+def _is_transaction_array(ai_response: str) -> bool:
+    try:
+        _parse_transaction_array(ai_response)
+        return True
+    except ValueError:
+        return False
 
-    # Create the prompt for transaction extraction
+def _extract_chunk(deployment_name: str, text: str, use_cache: bool = True) -> List[Dict[str, Any]]:
+    """Run one extraction request for a chunk of statement text; raises ValueError on an unusable reply."""
     prompt = create_transaction_extraction_prompt(text)
 
-    # Make the API call
-    deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
-    logger.info(f"Making Azure AI API call with deployment: {deployment_name}")
-
-    response = client.chat.completions.create(
-        model=deployment_name,
-        messages=[
+    ai_response = chat_completion(
+        [
             {
                 "role": "system",
                 "content": "Extract transactions from credit card statements. Return JSON array with date, description, amount, category."
@@ -76,42 +157,80 @@ def extract_transactions_with_ai(text: str) -> List[Dict[str, Any]]:
                 "content": prompt
             }
         ],
+        deployment_name,
+        use_cache=use_cache,
+        validate=_is_transaction_array,
         max_completion_tokens=10000
     )
 
     # Parse the response
-    ai_response = response.choices[0].message.content.strip()
+    ai_response = ai_response.strip()
     logger.info(f"Received AI response of {len(ai_response)} characters")
 
-    # Try to extract JSON from the response
     try:
-        # Look for JSON array in the response
-        json_start = ai_response.find('[')
-        json_end = ai_response.rfind(']') + 1
-
-        if json_start != -1 and json_end != -1:
-            json_content = ai_response[json_start:json_end]
-            transactions = json.loads(json_content)
-
-            # Validate and clean the transactions
-            cleaned_transactions = validate_and_clean_transactions(transactions)
-            logger.info(f"Successfully processed {len(cleaned_transactions)} transactions")
-            return cleaned_transactions
-        else:
-            logger.warning("No JSON array found in AI response")
-            return []
-
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse AI response as JSON: {e}")
+        transactions = _parse_transaction_array(ai_response)
+    except ValueError:
+        # json.JSONDecodeError is a ValueError too
         logger.debug(f"AI Response length: {len(ai_response)} characters, first 100 chars: {ai_response[:100]}...")
-        return []
+        raise
+
+    # Validate and clean the transactions
+    return validate_and_clean_transactions(transactions)
+
+def _try_extract_chunk(deployment_name: str, text: str, use_cache: bool) -> Optional[List[Dict[str, Any]]]:
+    try:
+        return _extract_chunk(deployment_name, text, use_cache)
+    except Exception as e:
+        logger.error(f"AI extraction failed for a chunk of {len(text)} characters: {e}")
+        return None
+
+def extract_transactions_with_ai(text: str, use_cache: bool = True) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Use Azure AI to extract transactions from text
+
+    The text is split into chunks within AI_CHUNK_MAX_TOKENS, the chunks are
+    extracted concurrently through the shared LLM gateway (which applies
+    the rate and concurrency limits) and the results are merged in statement order.
+
+    Args:
+        text: Raw text content
+        use_cache: Set to False to bypass the LLM response cache
+
+    Returns:
+        (transactions, failed_chunks): the transactions of the chunks that
+        were extracted and the number of chunks that failed
+
+    Raises:
+        ValueError: If no chunk could be extracted
+    """
+    logger.info("Starting Azure AI transaction extraction")
+
+    deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
+    chunks = split_statement_text(text)
+    logger.info(f"Making {len(chunks)} Azure AI API call(s) with deployment: {deployment_name}")
+
+    if len(chunks) == 1:
+        chunk_results = [_try_extract_chunk(deployment_name, chunks[0], use_cache)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(chunks), AI_MAX_CONCURRENCY)) as executor:
+            chunk_results = list(executor.map(lambda chunk: _try_extract_chunk(deployment_name, chunk, use_cache), chunks))
+
+    failed_chunks = sum(result is None for result in chunk_results)
+    if failed_chunks == len(chunks):
+        raise ValueError(f"AI extraction failed for all {len(chunks)} chunks")
+    if failed_chunks:
+        logger.warning(f"AI extraction failed for {failed_chunks} of {len(chunks)} chunks, their transactions are missing")
+
+    transactions = merge_chunk_results([result for result in chunk_results if result is not None])
+    logger.info(f"Successfully processed {len(transactions)} transactions")
+    return transactions, failed_chunks
 
 def create_transaction_extraction_prompt(text: str) -> str:
     """
     Create a prompt for transaction extraction
 
     Args:
-        text: Raw text content
+        text: Raw text content (one chunk, already within the token budget)
 
     Returns:
         Formatted prompt for AI
@@ -129,7 +248,7 @@ Return as JSON array:
 ]
 
 Text:
-{text[:4000]}
+{text}
 """
 
 def validate_and_clean_transactions(transactions: List[Dict]) -> List[Dict[str, Any]]:
@@ -2,66 +2,132 @@
 # AI-powered transaction categorization
 
 import os
+import json
 import logging
-from typing import Optional
-from openai import AzureOpenAI
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from services.llm_gateway import chat_completion
 
 logger = logging.getLogger(__name__)
 
-def categorize_transaction(description: str, amount: float) -> str:
-    """Use Azure AI to categorize a transaction based on description and amount."""
-    try:
-        client = AzureOpenAI(
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-        )
+VALID_CATEGORIES = ["Food", "Transportation", "Entertainment", "Utilities", "Rent", "Salary", "Shopping", "Healthcare", "Education", "Travel", "Insurance", "Subscriptions", "Other"]
 
-        # Determine if it's income or expense for better categorization
-        transaction_type = "income" if amount > 0 else "expense"
+# Distinct descriptions sent per categorization request
+CATEGORIZE_BATCH_SIZE = int(os.getenv("CATEGORIZE_BATCH_SIZE", "100"))
+# Batches of one call submitted at once (the gateway enforces the process-wide limits)
+CATEGORIZE_MAX_CONCURRENCY = int(os.getenv("CATEGORIZE_MAX_CONCURRENCY", "4"))
 
-        prompt = f"""
-        Categorize this financial transaction:
-        Description: {description}
-        Amount: ${amount:.2f}
-        Type: {transaction_type}
+def create_batch_categorization_prompt(items: List[Tuple[str, str]]) -> str:
+    """
+    Create a prompt categorizing many transactions at once.
 
-        Categories: Food, Transportation, Entertainment, Utilities, Rent, Salary, Shopping, Healthcare, Education, Travel, Insurance, Subscriptions, Other
+    Args:
+        items: (description, transaction type) pairs; their list index is the id
 
-        Return only the category name that best fits this transaction.
-        """
+    Returns:
+        Formatted prompt for AI
+    """
+    lines = "\n".join(
+        json.dumps({"id": index, "description": description, "type": transaction_type})
+        for index, (description, transaction_type) in enumerate(items)
+    )
+    return f"""Categorize each financial transaction below.
 
-        deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
+Categories: {", ".join(VALID_CATEGORIES)}
+
+Return a JSON object of the form {{"results": [{{"id": 0, "category": "Food"}}]}} with exactly one
+entry per transaction id. Use only the listed category names.
 
-        response = client.chat.completions.create(
-            model=deployment_name,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=20,
+Transactions (one JSON object per line):
+{lines}
+"""
+
+def _parse_batch_response(content: str, count: int) -> Tuple[List[str], int]:
+    """
+    Map a batch reply onto categories aligned with the batch.
+
+    Returns the categories ("Uncategorized" where the reply has no entry)
+    and the number of invalid categories replaced with "Other".
+    """
+    categories = ["Uncategorized"] * count
+    invalid = 0
+    for result in json.loads(content).get("results", []):
+        if not isinstance(result, dict):
+            continue
+        index = result.get("id")
+        if not isinstance(index, int) or not 0 <= index < count:
+            continue
+        category = str(result.get("category", "")).strip()
+        if category not in VALID_CATEGORIES:
+            invalid += 1
+            category = "Other"
+        categories[index] = category
+    return categories, invalid
+
+def _is_complete_batch_response(content: str, count: int) -> bool:
+    try:
+        categories, invalid = _parse_batch_response(content, count)
+    except Exception:
+        return False
+    return not invalid and "Uncategorized" not in categories
+
+def _categorize_batch(deployment_name: str, items: List[Tuple[str, str]], use_cache: bool) -> List[str]:
+    """Categorize one batch; returns categories aligned with items."""
+    try:
+        content = chat_completion(
+            [
+                {"role": "system", "content": "You categorize bank transactions. Respond with JSON only."},
+                {"role": "user", "content": create_batch_categorization_prompt(items)},
+            ],
+            deployment_name,
+            use_cache=use_cache,
+            # Partial or malformed replies are used once but not cached
+            validate=lambda reply: _is_complete_batch_response(reply, len(items)),
+            response_format={"type": "json_object"},
+            max_tokens=20 * len(items) + 50,
             temperature=0.1
         )
+        categories, invalid = _parse_batch_response(content, len(items))
+    except Exception as e:
+        logger.error(f"AI batch categorization failed for {len(items)} transactions: {e}")
+        return ["Uncategorized"] * len(items)
 
-        category = response.choices[0].message.content.strip()
+    missing = categories.count("Uncategorized")
+    if invalid or missing:
+        logger.warning(f"AI batch categorization: {invalid} invalid categories replaced with 'Other', {missing} transactions missing from response")
+    return categories
 
-        # Validate the category
-        valid_categories = ["Food", "Transportation", "Entertainment", "Utilities", "Rent", "Salary", "Shopping", "Healthcare", "Education", "Travel", "Insurance", "Subscriptions", "Other"]
+def _description_key(description: str, amount: float) -> Tuple[str, str]:
+    return " ".join(str(description).lower().split()), "income" if amount > 0 else "expense"
 
-        if category in valid_categories:
-            logger.info(f"Transaction successfully categorized as '{category}'")
-            return category
-        else:
-            logger.warning(f"AI returned invalid category '{category}', using 'Other'")
-            return "Other"
+def batch_categorize_transactions(transactions: list, use_cache: bool = True) -> list:
+    """
+    Categorize multiple transactions efficiently.
 
-    except Exception as e:
-        logger.error(f"AI categorization failed: {e}")
-        return "Uncategorized"
+    Identical descriptions (per income/expense type) are categorized once.
+    Distinct descriptions are packed CATEGORIZE_BATCH_SIZE per request and
+    the requests run concurrently through the shared LLM gateway.
+    """
+    unique: Dict[Tuple[str, str], int] = {}
+    items: List[Tuple[str, str]] = []
+    for tx in transactions:
+        key = _description_key(tx["description"], tx["amount"])
+        if key not in unique:
+            unique[key] = len(items)
+            items.append((str(tx["description"]).strip(), key[1]))
+
+    categories: List[str] = []
+    if items:
+        deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
+        batches = [items[start:start + CATEGORIZE_BATCH_SIZE] for start in range(0, len(items), CATEGORIZE_BATCH_SIZE)]
+        logger.info(f"Categorizing {len(transactions)} transactions ({len(items)} distinct) in {len(batches)} request(s)")
+        with ThreadPoolExecutor(max_workers=min(len(batches), CATEGORIZE_MAX_CONCURRENCY)) as executor:
+            for batch_categories in executor.map(lambda batch: _categorize_batch(deployment_name, batch, use_cache), batches):
+                categories.extend(batch_categories)
 
-def batch_categorize_transactions(transactions: list) -> list:
-    """Categorize multiple transactions efficiently."""
     categorized = []
     for tx in transactions:
-        category = categorize_transaction(tx["description"], tx["amount"])
         tx_copy = tx.copy()
-        tx_copy["category"] = category
+        tx_copy["category"] = categories[unique[_description_key(tx["description"], tx["amount"])]]
         categorized.append(tx_copy)
     return categorized
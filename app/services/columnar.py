@@ -0,0 +1,132 @@
+# Columnar service
+# Parquet and Arrow IPC exports built from server-side cursor batches, and Parquet imports
+
+import os
+import logging
+import importlib.util
+from typing import Iterator, List, Sequence
+
+from sqlalchemy.orm import Session
+
+from services.csv_parser import CSV_CHUNK_SIZE, TRANSACTION_COLUMNS, iter_normalized_chunks
+from services.exporter import iter_transaction_batches
+
+logger = logging.getLogger(__name__)
+
+# Codec for Parquet pages and Arrow IPC buffers
+COLUMNAR_COMPRESSION = os.getenv("COLUMNAR_COMPRESSION", "zstd")
+# Cursor batches are gathered into Parquet row groups of about this many rows
+PARQUET_ROW_GROUP_ROWS = int(os.getenv("PARQUET_ROW_GROUP_ROWS", "100000"))
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def _open_session():
+    from config import ReadSessionLocal
+    return ReadSessionLocal()
+
+# pyarrow is an optional dependency (the endpoints answer 501 without it), and it is
+# imported on first use so it stays out of the API's cold start
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("date", pa.date32()),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+    ])
+
+def _record_batch(schema, rows: List[Sequence]):
+    """Transpose one cursor batch of row tuples into typed Arrow columns."""
+    import pyarrow as pa
+    columns = list(zip(*rows))
+    return pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+def write_parquet(db: Session, path: str) -> int:
+    """
+    Write all transactions to a Parquet file.
+
+    Cursor batches are converted to Arrow record batches as they arrive and
+    flushed as one compressed row group every PARQUET_ROW_GROUP_ROWS rows,
+    so at most one row group is held in memory.
+
+    Returns the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _schema()
+    rows = 0
+    pending, pending_rows = [], 0
+    with pq.ParquetWriter(path, schema, compression=COLUMNAR_COMPRESSION) as writer:
+        for batch in iter_transaction_batches(db):
+            pending.append(_record_batch(schema, batch))
+            pending_rows += len(batch)
+            rows += len(batch)
+            if pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=pending_rows)
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=pending_rows)
+    logger.info(f"Wrote Parquet export of {rows} transactions")
+    return rows
+
+class _ChunkSink:
+    """Minimal writable file object collecting what the IPC writer emits between batches."""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def stream_arrow() -> Iterator[bytes]:
+    """
+    Encode all transactions as an Arrow IPC stream, one record batch per cursor batch.
+
+    Opens its own session because the generator outlives the request handler.
+    """
+    import pyarrow as pa
+    db = _open_session()
+    try:
+        schema = _schema()
+        sink = _ChunkSink()
+        options = pa.ipc.IpcWriteOptions(compression=COLUMNAR_COMPRESSION)
+        rows = 0
+        with pa.ipc.new_stream(sink, schema, options=options) as writer:
+            for batch in iter_transaction_batches(db):
+                writer.write_batch(_record_batch(schema, batch))
+                rows += len(batch)
+                yield sink.drain()
+        yield sink.drain()
+        logger.info(f"Streamed Arrow export of {rows} transactions")
+    finally:
+        db.close()
+
+def iter_parquet_chunks(source, chunksize: int = CSV_CHUNK_SIZE):
+    """
+    Stream a Parquet file as normalized column batches (same shape as iter_csv_chunks).
+
+    Args:
+        source: Path or binary file-like object
+        chunksize: Maximum rows per yielded DataFrame
+    """
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(source)
+    columns = [column for column in TRANSACTION_COLUMNS if column in parquet_file.schema_arrow.names]
+    batches = parquet_file.iter_batches(batch_size=chunksize, columns=columns)
+    yield from iter_normalized_chunks(batch.to_pandas() for batch in batches)
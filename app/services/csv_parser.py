@@ -1,15 +1,134 @@
-import pandas as pd
 import io
+import os
+import logging
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+# pandas is imported on first use rather than with the API
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Rows per DataFrame chunk; bounds peak memory regardless of file size
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", "100000"))
+
+# Date format of uploads: "auto" (detected once per file from a sample, see detect_date_format),
+# "ISO8601", "mixed" or a strptime format such as "%d/%m/%Y"
+CSV_DATE_FORMAT = os.getenv("CSV_DATE_FORMAT", "auto")
+# Read ambiguous non-ISO dates such as 03/04/2024 as day first (3 April)
+CSV_DAYFIRST = os.getenv("CSV_DAYFIRST", "false").lower() == "true"
+
+TRANSACTION_COLUMNS = ["date", "description", "amount", "category"]
+
+# Dates of the first chunk that format detection looks at
+_DATE_SAMPLE_SIZE = 1000
+# Candidate formats for "auto" after ISO 8601; the day-first ones are tried first with CSV_DAYFIRST
+_MONTH_FIRST_FORMATS = ["%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y"]
+_DAY_FIRST_FORMATS = ["%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y", "%d.%m.%Y"]
+_OTHER_DATE_FORMATS = ["%Y/%m/%d", "%d %b %Y", "%d-%b-%Y", "%b %d, %Y", "%b %d %Y"]
+
+def detect_date_format(values: "pd.Series") -> Optional[str]:
+    """
+    Pick the date format of a column from a sample of its values.
+
+    Returns CSV_DATE_FORMAT unless it is "auto". Otherwise the first
+    candidate format that parses every sampled value that is a date at all,
+    "mixed" if none does, or None if the sample holds no date to go by.
+    """
+    import pandas as pd
+    if CSV_DATE_FORMAT != "auto":
+        return CSV_DATE_FORMAT
+    sample = values.dropna().astype(str).head(_DATE_SAMPLE_SIZE)
+    sample = sample[pd.to_datetime(sample, format="mixed", dayfirst=CSV_DAYFIRST, errors="coerce").notna()]
+    if sample.empty:
+        return None
+    ambiguous = _DAY_FIRST_FORMATS + _MONTH_FIRST_FORMATS if CSV_DAYFIRST else _MONTH_FIRST_FORMATS + _DAY_FIRST_FORMATS
+    for date_format in ["ISO8601"] + ambiguous + _OTHER_DATE_FORMATS:
+        if pd.to_datetime(sample, format=date_format, errors="coerce").notna().all():
+            return date_format
+    logger.warning("No single date format fits the sample, parsing dates value by value")
+    return "mixed"
+
+def parse_dates(values: "pd.Series", date_format: Optional[str] = None) -> "pd.Series":
+    """
+    Parse a date column with one explicit format, so every value is read the
+    same way regardless of the chunk it lands in.
+
+    date_format is the format detected for the file (detected from values
+    when not given). In "auto" mode the values it does not fit fall back to
+    value-by-value parsing (honouring CSV_DAYFIRST); with a pinned
+    CSV_DATE_FORMAT they are invalid. Unparseable values become NaT.
+    """
+    import pandas as pd
+    if CSV_DATE_FORMAT != "auto":
+        return pd.to_datetime(values, format=CSV_DATE_FORMAT, dayfirst=CSV_DAYFIRST, errors="coerce")
+    date_format = date_format or detect_date_format(values) or "mixed"
+    dates = pd.to_datetime(values, format=date_format, dayfirst=CSV_DAYFIRST, errors="coerce")
+    rest = dates.isna() & values.notna()
+    if rest.any() and date_format != "mixed":
+        dates = dates.fillna(pd.to_datetime(values[rest], format="mixed", dayfirst=CSV_DAYFIRST, errors="coerce"))
+    return dates
+
+def normalize_chunk(chunk: "pd.DataFrame", date_format: Optional[str] = None) -> "pd.DataFrame":
+    """
+    Parse dates and amounts column-wise and drop rows that cannot be used.
+
+    The number of rows dropped for an unparseable date or amount is kept in
+    frame.attrs["invalid_dates"] / frame.attrs["invalid_amounts"].
+    """
+    import pandas as pd
+    frame = pd.DataFrame({
+        "date": parse_dates(chunk["date"], date_format).dt.normalize(),
+        "description": chunk["description"].fillna("").astype(str),
+        "amount": pd.to_numeric(chunk["amount"], errors="coerce").astype("float64"),
+        "category": chunk["category"] if "category" in chunk.columns else None,
+    })
+
+    invalid_dates = frame["date"].isna()
+    invalid_amounts = frame["amount"].isna() & ~invalid_dates
+    invalid = invalid_dates | invalid_amounts
+    if invalid.any():
+        logger.warning(f"Skipping {int(invalid_dates.sum())} rows with unparseable date and {int(invalid_amounts.sum())} with unparseable amount")
+        frame = frame[~invalid]
+    frame.attrs["invalid_dates"] = int(invalid_dates.sum())
+    frame.attrs["invalid_amounts"] = int(invalid_amounts.sum())
+    return frame
+
+def iter_normalized_chunks(chunks: Iterable["pd.DataFrame"]) -> Iterator["pd.DataFrame"]:
+    """normalize_chunk over the chunks of one file, with the date format detected once from the first dates."""
+    date_format = None
+    for chunk in chunks:
+        date_format = date_format or detect_date_format(chunk["date"])
+        yield normalize_chunk(chunk, date_format)
+
+def iter_csv_chunks(source, chunksize: int = CSV_CHUNK_SIZE):
+    """
+    Stream a CSV export as normalized column batches.
+
+    Args:
+        source: CSV content as bytes, or a binary file-like object
+        chunksize: Number of rows per yielded DataFrame
+
+    Yields:
+        DataFrames with date (datetime64), description, amount (float) and category columns
+    """
+    import pandas as pd
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    reader = pd.read_csv(
+        source,
+        chunksize=chunksize,
+        usecols=lambda column: column in TRANSACTION_COLUMNS,
+        dtype={"description": str, "category": str},
+    )
+    yield from iter_normalized_chunks(reader)
 
 def parse_csv(content):
-    df = pd.read_csv(io.BytesIO(content))
+    """Parse a (small) CSV export into a list of transaction dicts."""
     transactions = []
-    for _, row in df.iterrows():
-        tx = {
-            "date": str(pd.to_datetime(row["date"]).date()),
-            "description": row["description"],
-            "amount": float(row["amount"]),
-            "category": row.get("category", None),
-        }
-        transactions.append(tx)
+    for frame in iter_csv_chunks(content):
+        frame = frame.assign(date=frame["date"].dt.strftime("%Y-%m-%d"))
+        frame = frame.astype(object).where(frame.notna(), None)
+        transactions.extend(frame.to_dict("records"))
     return transactions
@@ -0,0 +1,200 @@
+# Duplicates service
+# Near-duplicate detection: candidates are blocked by amount and date window, then compared on description trigrams
+
+import os
+import logging
+from collections import deque
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
+
+from db.models import DuplicateCandidate, Transaction
+from services.merchant_rules import normalize_description
+
+logger = logging.getLogger(__name__)
+
+# Rows with the same amount at most this many days apart are compared
+DUPLICATE_DATE_WINDOW_DAYS = int(os.getenv("DUPLICATE_DATE_WINDOW_DAYS", "3"))
+# Trigram Jaccard similarity from which a pair is flagged
+DUPLICATE_MIN_SIMILARITY = float(os.getenv("DUPLICATE_MIN_SIMILARITY", "0.5"))
+# Earlier rows of the same block compared per row, so one crowded block cannot go quadratic
+DUPLICATE_MAX_BLOCK = int(os.getenv("DUPLICATE_MAX_BLOCK", "200"))
+# Check newly inserted rows during ingest
+DUPLICATE_DETECTION_AT_INGEST = os.getenv("DUPLICATE_DETECTION_AT_INGEST", "true").lower() == "true"
+
+# Rows fetched per server-side cursor round trip by the batch scan
+_SCAN_BATCH_SIZE = 10_000
+
+class _Row(NamedTuple):
+    id: int
+    date: Any
+    amount: float
+    # Case-folded description; identical text on another date is a repeat payment, not a duplicate
+    # (on the same date it is compared: rows that predate fingerprints can still collide)
+    text: str
+    trigrams: frozenset
+
+def description_trigrams(description: str) -> frozenset:
+    """Character trigrams of the normalized description (digits and punctuation dropped), padded like pg_trgm."""
+    padded = f"  {normalize_description(description)} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def trigram_similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+def _to_row(id, date, amount, description) -> _Row:
+    return _Row(id, date, amount, " ".join(str(description).casefold().split()), description_trigrams(description))
+
+def find_near_duplicates(rows: Iterable[_Row], keep: Optional[Callable[[_Row, _Row], bool]] = None,
+                         window_days: int = None, min_similarity: float = None) -> List[Tuple[int, int, float]]:
+    """
+    Near-duplicate pairs among rows sorted by (amount, date, id).
+
+    A sliding window holds the earlier rows with the same amount that are at
+    most window_days older; each row is compared with (at most
+    DUPLICATE_MAX_BLOCK of) them only, so the work grows linearly with the
+    number of rows rather than quadratically. Descriptions are never searched
+    across blocks, so they need no trigram index: idx_amount_date finds the
+    blocks.
+
+    Returns (newer id, older id, similarity) tuples; keep(row, other) can
+    restrict which pairs are compared.
+    """
+    window = timedelta(days=DUPLICATE_DATE_WINDOW_DAYS if window_days is None else window_days)
+    threshold = DUPLICATE_MIN_SIMILARITY if min_similarity is None else min_similarity
+    pairs = []
+    block = deque(maxlen=DUPLICATE_MAX_BLOCK)
+    for row in rows:
+        if block and block[-1].amount != row.amount:
+            block.clear()
+        while block and block[0].date < row.date - window:
+            block.popleft()
+        for other in block:
+            if (other.text == row.text and other.date != row.date) or (keep and not keep(row, other)):
+                continue
+            similarity = trigram_similarity(row.trigrams, other.trigrams)
+            if similarity >= threshold:
+                newer, older = (row, other) if row.id > other.id else (other, row)
+                pairs.append((newer.id, older.id, round(similarity, 3)))
+        block.append(row)
+    return pairs
+
+def _store_pairs(db: Session, pairs: List[Tuple[int, int, float]]):
+    if pairs:
+        db.execute(
+            pg_insert(DuplicateCandidate).on_conflict_do_nothing(),
+            [{"transaction_id": newer, "duplicate_of_id": older, "similarity": similarity} for newer, older, similarity in pairs],
+        )
+
+_NEIGHBOURS_SQL = """
+    SELECT DISTINCT t.id, t.date, t.amount, t.description
+    FROM transactions t
+    JOIN unnest(CAST(:amounts AS double precision[]), CAST(:dates AS date[])) AS v(amount, date)
+      ON t.amount = v.amount AND t.date BETWEEN v.date - :window AND v.date + :window
+"""
+
+def detect_near_duplicates(db: Session, ids: List[int]) -> int:
+    """
+    Flag near-duplicates of freshly inserted transactions.
+
+    Fetches every row sharing an amount with a new row within the date window
+    (one indexed join on amount and date), then scans those blocks; only
+    pairs involving a new row are kept.
+
+    Returns the number of pairs flagged.
+    """
+    if not ids:
+        return 0
+    new_rows = db.execute(
+        select(Transaction.date, Transaction.amount).where(Transaction.id.in_(ids)).distinct()
+    ).all()
+    neighbours = db.execute(text(_NEIGHBOURS_SQL), {
+        "amounts": [row.amount for row in new_rows],
+        "dates": [row.date for row in new_rows],
+        "window": DUPLICATE_DATE_WINDOW_DAYS,
+    }).all()
+
+    new_ids = set(ids)
+    rows = sorted((_to_row(*row) for row in neighbours), key=lambda row: (row.amount, row.date, row.id))
+    pairs = find_near_duplicates(rows, keep=lambda row, other: row.id in new_ids or other.id in new_ids)
+    try:
+        _store_pairs(db, pairs)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if pairs:
+        logger.info(f"Flagged {len(pairs)} near-duplicate transaction pairs")
+    return len(pairs)
+
+def scan_near_duplicates(db: Session, progress: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+    """
+    Re-detect near-duplicates over the whole table.
+
+    Rows are streamed through a server-side cursor in (amount, date, id)
+    order, so memory holds one block window and the result pairs. The
+    previous near-duplicate candidates are replaced in a single transaction;
+    fingerprint collision flags (see db/fingerprints.py) are kept.
+
+    Returns a dict with "scanned" rows and flagged "candidates".
+    """
+    query = (
+        select(Transaction.id, Transaction.date, Transaction.amount, Transaction.description)
+        .order_by(Transaction.amount, Transaction.date, Transaction.id)
+        .execution_options(yield_per=_SCAN_BATCH_SIZE)
+    )
+    scanned = 0
+
+    def rows():
+        nonlocal scanned
+        for partition in db.execute(query).partitions():
+            for row in partition:
+                yield _to_row(*row)
+            scanned += len(partition)
+            if progress:
+                progress(scanned)
+
+    pairs = find_near_duplicates(rows())
+    try:
+        db.execute(delete(DuplicateCandidate).where(DuplicateCandidate.kind == "near"))
+        _store_pairs(db, pairs)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"Near-duplicate scan of {scanned} transactions flagged {len(pairs)} pairs")
+    return {"scanned": scanned, "candidates": len(pairs)}
+
+def run_duplicate_scan(job) -> Dict[str, int]:
+    """Background job pipeline (see services/jobs.py) for scan_near_duplicates."""
+    from config import SessionLocal
+    db = SessionLocal()
+    try:
+        with job.run_stage("scan"):
+            return scan_near_duplicates(db, progress=lambda scanned: job.update_progress(scanned=scanned))
+    finally:
+        db.close()
+
+def _transaction_dict(row) -> Dict[str, Any]:
+    return {"id": row.id, "date": row.date.isoformat(), "description": row.description, "amount": row.amount, "category": row.category}
+
+def list_near_duplicates(db: Session, limit: int = 100) -> List[Dict[str, Any]]:
+    """Flagged pairs whose rows both still exist, most similar first."""
+    newer, older = aliased(Transaction), aliased(Transaction)
+    rows = db.execute(
+        select(DuplicateCandidate.similarity, DuplicateCandidate.kind, newer, older)
+        .join(newer, newer.id == DuplicateCandidate.transaction_id)
+        .join(older, older.id == DuplicateCandidate.duplicate_of_id)
+        .order_by(DuplicateCandidate.similarity.desc(), DuplicateCandidate.transaction_id)
+        .limit(limit)
+    ).all()
+    return [
+        {"similarity": similarity, "kind": kind, "transaction": _transaction_dict(tx), "duplicate_of": _transaction_dict(original)}
+        for similarity, kind, tx, original in rows
+    ]
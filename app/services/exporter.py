@@ -0,0 +1,105 @@
+# Exporter service
+# Streaming transaction exports read in batches through a server-side cursor
+
+import os
+import csv
+import io
+import logging
+from typing import Iterator, List, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per server-side cursor round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+# Data rows per worksheet; Excel allows 1,048,576 rows including the header
+EXCEL_MAX_ROWS_PER_SHEET = int(os.getenv("EXCEL_MAX_ROWS_PER_SHEET", str(1_048_576 - 1)))
+
+EXPORT_COLUMNS = ["date", "description", "amount", "category"]
+
+def _open_session():
+    from config import ReadSessionLocal
+    return ReadSessionLocal()
+
+def iter_transaction_batches(db: Session, batch_size: int = None) -> Iterator[List[Sequence]]:
+    """
+    Yield lists of (date, description, amount, category) rows, ordered by (date, id).
+
+    yield_per streams results through a named server-side cursor, so only
+    one batch is held in memory at a time.
+    """
+    query = (
+        select(Transaction.date, Transaction.description, Transaction.amount, Transaction.category)
+        .order_by(Transaction.date, Transaction.id)
+        .execution_options(yield_per=batch_size or EXPORT_BATCH_SIZE)
+    )
+    for partition in db.execute(query).partitions():
+        yield partition
+
+async def ahas_transactions(db: AsyncSession) -> bool:
+    return (await db.execute(select(Transaction.id).limit(1))).first() is not None
+
+def stream_csv() -> Iterator[str]:
+    """
+    Encode all transactions as CSV, one chunk per batch.
+
+    Opens its own session because the generator outlives the request handler.
+    """
+    db = _open_session()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(EXPORT_COLUMNS)
+        rows = 0
+        for batch in iter_transaction_batches(db):
+            writer.writerows(batch)
+            rows += len(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        logger.info(f"Streamed CSV export of {rows} transactions")
+    finally:
+        db.close()
+
+def write_excel(db: Session, path: str, max_rows_per_sheet: int = None) -> int:
+    """
+    Write all transactions to an .xlsx file at path.
+
+    Uses an openpyxl write-only workbook: rows are appended batch by batch
+    and openpyxl spills each sheet to a temporary file, so memory does not
+    grow with the export size. A new sheet ("Transactions 2", ...) is started
+    whenever a sheet reaches max_rows_per_sheet data rows.
+
+    Returns the number of rows written.
+    """
+    from openpyxl import Workbook
+    max_rows = max_rows_per_sheet or EXCEL_MAX_ROWS_PER_SHEET
+    workbook = Workbook(write_only=True)
+    sheet_rows = 0
+    rows = 0
+
+    def new_sheet():
+        ws = workbook.create_sheet("Transactions" if not workbook.worksheets else f"Transactions {len(workbook.worksheets) + 1}")
+        ws.append(EXPORT_COLUMNS)
+        return ws
+
+    sheet = new_sheet()
+    for batch in iter_transaction_batches(db):
+        for row in batch:
+            if sheet_rows == max_rows:
+                sheet = new_sheet()
+                sheet_rows = 0
+            sheet.append(tuple(row))
+            sheet_rows += 1
+        rows += len(batch)
+
+    workbook.save(path)
+    logger.info(f"Wrote Excel export of {rows} transactions to {len(workbook.worksheets)} sheet(s)")
+    return rows
@@ -0,0 +1,197 @@
+# Ingest service
+# Staged upload pipelines executed by background jobs (parse -> extract -> insert)
+
+import os
+import logging
+from typing import Any, Dict
+
+from db.crud import bulk_insert_transactions, bulk_insert_frame
+from services.csv_parser import iter_csv_chunks
+from services.columnar import iter_parquet_chunks
+from services.pdf_parser import iter_pdf_page_extracts
+from services.ai_parser import parse_with_ai, PAGE_SEPARATOR
+from services.jobs import IngestJob
+from services.merchant_rules import categorize_transactions, categorize_frame
+from services.upload_cache import compute_content_hash, get_cached_transactions, store_transactions
+from services.duplicates import detect_near_duplicates, DUPLICATE_DETECTION_AT_INGEST
+
+logger = logging.getLogger(__name__)
+
+def _open_session():
+    from config import SessionLocal
+    return SessionLocal()
+
+def _flag_near_duplicates(job: IngestJob, db, ids) -> int:
+    """Flag near-duplicates of the inserted rows; a failure here never fails the (already committed) ingest."""
+    if not DUPLICATE_DETECTION_AT_INGEST or not ids:
+        return 0
+    try:
+        with job.run_stage("duplicates"):
+            return detect_near_duplicates(db, ids)
+    except Exception as e:
+        logger.warning(f"Near-duplicate detection failed: {e}")
+        return 0
+
+def _extract_pdf_transactions(job: IngestJob, content: bytes):
+    """
+    Extract transactions page by page; pages whose table/word layout parses
+    cleanly are converted locally, only the remaining pages go to the LLM.
+
+    Returns (transactions, page_metrics, complete) where complete is False
+    if the AI fallback failed for any chunk of the remaining pages.
+    """
+    transactions = []
+    llm_page_texts = []
+    page_metrics = []
+    with job.run_stage("parse"):
+        for page in iter_pdf_page_extracts(content):
+            extraction = page["extraction"]
+            if extraction["path"] == "llm":
+                llm_page_texts.append(page["text"])
+            else:
+                transactions.extend(extraction["transactions"])
+            page_metrics.append({
+                "page": page["page"],
+                "path": extraction["path"],
+                "rows": len(extraction["transactions"]),
+                "candidates": extraction["candidates"],
+                "confidence": extraction["confidence"],
+                "duration_ms": page["duration_ms"],
+            })
+            job.update_progress(pages_extracted=page["page"])
+            job.increment_progress(**{"pages_llm" if extraction["path"] == "llm" else "pages_local": 1})
+
+    if not transactions and not llm_page_texts:
+        raise ValueError("Failed to extract transactions from PDF")
+    logger.info(f"Local extraction parsed {len(transactions)} transactions, {len(llm_page_texts)} pages need AI parsing")
+
+    complete = True
+    if llm_page_texts:
+        with job.run_stage("extract"):
+            ai_transactions, complete = parse_with_ai(PAGE_SEPARATOR.join(llm_page_texts))
+        transactions.extend(ai_transactions)
+        logger.info(f"AI parsing complete, extracted {len(ai_transactions)} transactions")
+    return transactions, page_metrics, complete
+
+def ingest_pdf(job: IngestJob, content: bytes) -> Dict[str, Any]:
+    """
+    Extract, parse and store the transactions of a PDF statement.
+
+    Byte-identical re-uploads are served from the upload cache and only
+    re-inserted (which is cheap: duplicates are skipped by the database).
+
+    Args:
+        job: Job used to report stage timings and progress
+        content: PDF file content as bytes
+
+    Returns:
+        Dict with inserted, skipped and near-duplicate counts, cache status and per-page extraction metrics
+    """
+    digest = compute_content_hash(content)
+    db = _open_session()
+    try:
+        with job.run_stage("cache"):
+            transactions = get_cached_transactions(db, digest)
+        cached = transactions is not None
+        job.update_progress(cache_hit=cached)
+
+        page_metrics = []
+        if not cached:
+            transactions, page_metrics, complete = _extract_pdf_transactions(job, content)
+            with job.run_stage("categorize"):
+                transactions, categorize_stats = categorize_transactions(db, transactions)
+            job.update_progress(extraction_complete=complete, **categorize_stats)
+            if complete:
+                try:
+                    store_transactions(db, digest, "pdf", job.filename, len(content), transactions)
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f"Could not store upload cache entry: {e}")
+        job.update_progress(transactions=len(transactions))
+
+        with job.run_stage("insert"):
+            result = bulk_insert_transactions(db, transactions)
+        near_duplicates = _flag_near_duplicates(job, db, result["ids"])
+    finally:
+        db.close()
+
+    job.update_progress(inserted=result["inserted"], skipped=result["skipped"], near_duplicates=near_duplicates)
+    logger.info(f"Successfully inserted {result['inserted']} transactions into database ({result['skipped']} duplicates skipped)")
+    return {
+        "transactions": result["inserted"],
+        "skipped": result["skipped"],
+        "near_duplicates": near_duplicates,
+        "cached": cached,
+        "sha256": digest,
+        "pages": page_metrics,
+    }
+
+def _ingest_chunks(job: IngestJob, chunks) -> Dict[str, Any]:
+    """Categorize and insert normalized column batches, reporting per-stage timings."""
+    db = _open_session()
+    try:
+        while True:
+            with job.run_stage("parse"):
+                frame = next(chunks, None)
+            if frame is None:
+                break
+            job.increment_progress(rows_parsed=len(frame), invalid_dates=frame.attrs.get("invalid_dates", 0),
+                                   invalid_amounts=frame.attrs.get("invalid_amounts", 0))
+
+            with job.run_stage("categorize"):
+                frame, categorize_stats = categorize_frame(db, frame)
+            job.increment_progress(**categorize_stats)
+
+            with job.run_stage("insert"):
+                result = bulk_insert_frame(db, frame)
+            job.increment_progress(inserted=result["inserted"], skipped=result["skipped"],
+                                   near_duplicates=_flag_near_duplicates(job, db, result["ids"]))
+    finally:
+        db.close()
+
+    logger.info(f"Successfully inserted {job.progress.get('inserted', 0)} transactions into database ({job.progress.get('skipped', 0)} duplicates skipped)")
+    return {
+        "inserted": job.progress.get("inserted", 0),
+        "skipped": job.progress.get("skipped", 0),
+        "near_duplicates": job.progress.get("near_duplicates", 0),
+        "invalid_dates": job.progress.get("invalid_dates", 0),
+        "invalid_amounts": job.progress.get("invalid_amounts", 0),
+    }
+
+def ingest_csv(job: IngestJob, path: str) -> Dict[str, Any]:
+    """
+    Stream a spooled CSV upload into the database chunk by chunk.
+
+    Args:
+        job: Job used to report stage timings and progress
+        path: Path of the temporary file holding the upload (removed afterwards)
+
+    Returns:
+        Dict with inserted, skipped and near-duplicate counts, and the rows
+        dropped for an invalid date or amount
+    """
+    try:
+        with open(path, "rb") as source:
+            return _ingest_chunks(job, iter_csv_chunks(source))
+    finally:
+        os.remove(path)
+
+def ingest_parquet(job: IngestJob, path: str) -> Dict[str, Any]:
+    """
+    Stream a spooled Parquet upload into the database one record batch range at a time.
+
+    Columns go straight from Arrow into DataFrames and the COPY path; no
+    per-row dicts are built.
+
+    Args:
+        job: Job used to report stage timings and progress
+        path: Path of the temporary file holding the upload (removed afterwards)
+
+    Returns:
+        Dict with inserted, skipped and near-duplicate counts, and the rows
+        dropped for an invalid date or amount
+    """
+    try:
+        return _ingest_chunks(job, iter_parquet_chunks(path))
+    finally:
+        os.remove(path)
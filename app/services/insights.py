@@ -1,71 +1,114 @@
-import pandas as pd
-from db.models import Transaction
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select
+from db.crud import run_with_read_session
+from db.models import Transaction, TransactionRollup
+from services.snapshot import get_transactions_frame
 from collections import defaultdict
 from datetime import datetime, timedelta
-from prophet import Prophet
 
-def get_summary(db):
-    results = db.query(Transaction).all()
-    df = pd.DataFrame([{
-        "date": t.date,
-        "description": t.description,
-        "amount": t.amount,
-        "category": t.category
-    } for t in results])
-
-    total_expenses = df[df["amount"] < 0]["amount"].sum() if not df.empty else 0
-    total_income = df[df["amount"] > 0]["amount"].sum() if not df.empty else 0
-    balance = total_income + total_expenses
+# pandas and Prophet are imported by the functions that use them, which keeps
+# them (and Prophet's matplotlib/cmdstanpy) out of the API's cold start
+
+def _date_bounded(query, start_date=None, end_date=None):
+    """Restrict a transactions query to [start_date, end_date]; on a partitioned table only those months are scanned."""
+    if start_date is not None:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date is not None:
+        query = query.filter(Transaction.date <= end_date)
+    return query
+
+def get_summary(db, start_date=None, end_date=None):
+    """Income, expense and balance totals, aggregated in the database."""
+    total_income, total_expenses, count = _date_bounded(db.query(
+        func.coalesce(func.sum(Transaction.amount).filter(Transaction.amount > 0), 0.0),
+        func.coalesce(func.sum(Transaction.amount).filter(Transaction.amount < 0), 0.0),
+        func.count(Transaction.id),
+    ), start_date, end_date).one()
 
     return {
         "total_income": total_income,
         "total_expenses": total_expenses,
-        "balance": balance,
-        "transactions": len(df)
+        "balance": total_income + total_expenses,
+        "transactions": count
     }
 
-def get_categories(db):
-    results = db.query(Transaction).all()
-    df = pd.DataFrame([{
-        "category": t.category or "Uncategorized",
-        "amount": t.amount
-    } for t in results])
-
-    if df.empty:
-        return []
-
-    # Group by category and sum amounts (only expenses for pie chart)
-    expenses_df = df[df["amount"] < 0]
-    grouped = expenses_df.groupby("category")["amount"].sum().abs().reset_index()
-    grouped = grouped.sort_values("amount", ascending=False)
+def get_categories(db, start_date=None, end_date=None):
+    """Expense totals per category (positive amounts, largest first) for the pie chart."""
+    category = func.coalesce(Transaction.category, "Uncategorized")
+    total = func.abs(func.sum(Transaction.amount))
+    rows = (
+        _date_bounded(db.query(category.label("category"), total.label("amount")), start_date, end_date)
+        .filter(Transaction.amount < 0)
+        .group_by(category)
+        .order_by(total.desc())
+        .all()
+    )
+    return [{"category": row.category, "amount": row.amount} for row in rows]
+
+def get_monthly_trends(db, start_date=None, end_date=None):
+    """Net amount per calendar month ("YYYY-MM"), oldest first."""
+    month = func.to_char(func.date_trunc("month", Transaction.date), "YYYY-MM")
+    rows = (
+        _date_bounded(db.query(month.label("month"), func.sum(Transaction.amount).label("amount")), start_date, end_date)
+        .group_by(month)
+        .order_by(month)
+        .all()
+    )
+    return [{"month": row.month, "amount": row.amount} for row in rows]
+
+_ROLLUP_SUMMARY = select(
+    func.coalesce(func.sum(TransactionRollup.total).filter(TransactionRollup.sign > 0), 0.0),
+    func.coalesce(func.sum(TransactionRollup.total).filter(TransactionRollup.sign < 0), 0.0),
+    func.coalesce(func.sum(TransactionRollup.count), 0),
+)
+
+_ROLLUP_EXPENSE_TOTAL = func.abs(func.sum(TransactionRollup.total))
+_ROLLUP_CATEGORIES = (
+    select(TransactionRollup.category, _ROLLUP_EXPENSE_TOTAL.label("amount"))
+    .where(TransactionRollup.sign < 0)
+    .group_by(TransactionRollup.category)
+    .order_by(_ROLLUP_EXPENSE_TOTAL.desc())
+)
+
+_ROLLUP_MONTHLY = (
+    select(TransactionRollup.month, func.sum(TransactionRollup.total).label("amount"))
+    .group_by(TransactionRollup.month)
+    .order_by(TransactionRollup.month)
+)
+
+def _summary_from_row(row):
+    total_income, total_expenses, count = row
+    return {
+        "total_income": total_income,
+        "total_expenses": total_expenses,
+        "balance": total_income + total_expenses,
+        "transactions": int(count)
+    }
 
-    return grouped.to_dict("records")
+def _categories_from_rows(rows):
+    return [{"category": row.category, "amount": row.amount} for row in rows]
 
-def get_monthly_trends(db):
-    results = db.query(Transaction).all()
-    df = pd.DataFrame([{
-        "date": t.date,
-        "amount": t.amount
-    } for t in results])
+def _monthly_from_rows(rows):
+    return [{"month": row.month.strftime("%Y-%m"), "amount": row.amount} for row in rows]
 
-    if df.empty:
-        return []
+async def aget_rollup_summary(db):
+    """get_summary served from transaction_rollups (independent of the number of transactions), on an AsyncSession."""
+    return _summary_from_row((await db.execute(_ROLLUP_SUMMARY)).one())
 
-    df["month"] = pd.to_datetime(df["date"]).dt.to_period("M").astype(str)
-    monthly = df.groupby("month")["amount"].sum().reset_index()
-    monthly = monthly.sort_values("month")
+async def aget_rollup_categories(db):
+    """get_categories served from transaction_rollups, on an AsyncSession."""
+    return _categories_from_rows((await db.execute(_ROLLUP_CATEGORIES)).all())
 
-    return monthly.to_dict("records")
+async def aget_rollup_monthly_trends(db):
+    """get_monthly_trends served from transaction_rollups, on an AsyncSession."""
+    return _monthly_from_rows((await db.execute(_ROLLUP_MONTHLY)).all())
 
 def detect_anomalies(db):
     """Detect outlier spends using statistical methods."""
-    results = db.query(Transaction).filter(Transaction.amount < 0).all()
-    df = pd.DataFrame([{
-        "date": t.date,
-        "description": t.description,
-        "amount": t.amount,
-        "category": t.category
-    } for t in results])
+    df = get_transactions_frame(db, ["date", "description", "amount", "category"])
+    df = df[df["amount"] < 0]
 
     if len(df) < 10:  # Need minimum data for anomaly detection
         return []
@@ -98,6 +141,7 @@ def detect_anomalies(db):
 
     # Sort by most anomalous (highest z-score)
     anomalies = anomalies.sort_values("z_score", ascending=False)
+    anomalies["date"] = anomalies["date"].dt.date
 
     return anomalies[[
         "date", "description", "amount", "category", "z_score"
@@ -105,12 +149,10 @@ def detect_anomalies(db):
 
 def forecast_expenses(db):
     """Enhanced forecasting with multiple methods and better insights."""
-    results = db.query(Transaction).all()
-    df = pd.DataFrame([{
-        "date": t.date,
-        "amount": t.amount,
-        "category": t.category or "Uncategorized"
-    } for t in results])
+    import pandas as pd
+
+    df = get_transactions_frame(db, ["date", "amount", "category"])
+    df["category"] = df["category"].fillna("Uncategorized")
 
     if len(df) < 10:  # Reduced minimum requirement
         return {
@@ -288,6 +330,9 @@ def _calculate_seasonal_adjustment(monthly_series):
 
 def _prophet_forecast_optimized(monthly_series):
     """Optimized Prophet forecast with reduced processing time."""
+    import pandas as pd
+    from prophet import Prophet
+
     try:
         # Prepare data for Prophet
         df_prophet = pd.DataFrame({
@@ -322,13 +367,8 @@ def _prophet_forecast_optimized(monthly_series):
 
 def detect_recurring_expenses(db):
     """Detect recurring expenses like subscriptions and rent."""
-    results = db.query(Transaction).filter(Transaction.amount < 0).all()
-    df = pd.DataFrame([{
-        "date": t.date,
-        "description": t.description,
-        "amount": t.amount,
-        "category": t.category
-    } for t in results])
+    df = get_transactions_frame(db, ["date", "description", "amount", "category"])
+    df = df[df["amount"] < 0]
 
     if df.empty or len(df) < 3:
         return []
@@ -374,8 +414,21 @@ def detect_recurring_expenses(db):
                     "avg_interval_days": round(avg_interval, 1),
                     "occurrences": int(row['count']),
                     "category": row['category'] or "Uncategorized",
-                    "first_date": row['first_date'].isoformat(),
-                    "last_date": row['last_date'].isoformat()
+                    "first_date": row['first_date'].date().isoformat(),
+                    "last_date": row['last_date'].date().isoformat()
                 })
 
     return recurring_candidates
+
+# Threads computing snapshot-based insights off the event loop
+INSIGHTS_WORKERS = int(os.getenv("INSIGHTS_WORKERS", "4"))
+
+_insights_executor = ThreadPoolExecutor(max_workers=INSIGHTS_WORKERS, thread_name_prefix="insights")
+
+async def compute_insight(func):
+    """
+    Run a synchronous insight function (e.g. forecast_expenses) on the insights
+    thread pool with its own session, so pandas/Prophet work never blocks the
+    event loop and at most INSIGHTS_WORKERS computations run at once.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_insights_executor, run_with_read_session, func)
@@ -0,0 +1,184 @@
+# Jobs service
+# Background ingestion jobs processed by a bounded worker pool
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Number of uploads processed concurrently
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# Queued + running jobs accepted before uploads are rejected
+INGEST_MAX_PENDING_JOBS = int(os.getenv("INGEST_MAX_PENDING_JOBS", "100"))
+# Finished jobs kept in memory for status polling
+INGEST_MAX_RETAINED_JOBS = int(os.getenv("INGEST_MAX_RETAINED_JOBS", "500"))
+
+class JobQueueFull(Exception):
+    """Raised when the ingestion queue already holds the maximum number of pending jobs."""
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+class IngestJob:
+    """State of a single upload moving through its processing stages."""
+
+    def __init__(self, kind: str, filename: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.filename = filename
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.stages: Dict[str, Dict[str, Any]] = OrderedDict()
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @contextmanager
+    def run_stage(self, name: str):
+        """
+        Time a processing stage. Entering the same stage several times
+        (e.g. once per CSV chunk) accumulates its duration.
+        """
+        started = time.time()
+        with self._lock:
+            self.stage = name
+            timing = self.stages.setdefault(name, {"started_at": started, "finished_at": None, "duration_seconds": 0.0})
+        try:
+            yield
+        finally:
+            finished = time.time()
+            with self._lock:
+                timing["finished_at"] = finished
+                timing["duration_seconds"] += finished - started
+
+    def update_progress(self, **counters):
+        """Set progress counters (e.g. rows_parsed=..., inserted=...)."""
+        with self._lock:
+            self.progress.update(counters)
+
+    def increment_progress(self, **counters):
+        """Add to progress counters."""
+        with self._lock:
+            for key, value in counters.items():
+                self.progress[key] = self.progress.get(key, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "filename": self.filename,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "stages": {
+                    name: {
+                        "started_at": _isoformat(timing["started_at"]),
+                        "finished_at": _isoformat(timing["finished_at"]),
+                        "duration_seconds": round(timing["duration_seconds"], 4),
+                    }
+                    for name, timing in self.stages.items()
+                },
+                "result": self.result,
+                "error": self.error,
+                "created_at": _isoformat(self.created_at),
+                "started_at": _isoformat(self.started_at),
+                "finished_at": _isoformat(self.finished_at),
+            }
+
+_jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+    return _executor
+
+def _prune_finished_jobs():
+    """Drop the oldest finished jobs beyond the retention limit (caller holds _jobs_lock)."""
+    excess = len(_jobs) - INGEST_MAX_RETAINED_JOBS
+    if excess <= 0:
+        return
+    for job_id in [job.id for job in _jobs.values() if not job.pending][:excess]:
+        del _jobs[job_id]
+
+def _run_job(job: IngestJob, pipeline: Callable[[IngestJob], Dict[str, Any]], on_success: Optional[Callable[[], None]]):
+    job.status = "running"
+    job.started_at = time.time()
+    logger.info(f"Job {job.id} ({job.kind}) started")
+    try:
+        job.result = pipeline(job)
+        job.status = "completed"
+        if on_success:
+            on_success()
+        logger.info(f"Job {job.id} ({job.kind}) completed")
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        logger.error(f"Job {job.id} ({job.kind}) failed in stage '{job.stage}': {e}")
+    finally:
+        job.stage = None
+        job.finished_at = time.time()
+
+def submit_job(kind: str, filename: Optional[str], pipeline: Callable[[IngestJob], Dict[str, Any]],
+               on_success: Optional[Callable[[], None]] = None) -> IngestJob:
+    """
+    Queue an ingestion pipeline for background processing.
+
+    Args:
+        kind: Job type label (e.g. "pdf", "csv")
+        filename: Name of the uploaded file
+        pipeline: Callable receiving the job and returning its result dict
+        on_success: Optional callback run after the pipeline completes
+
+    Returns:
+        The queued job
+
+    Raises:
+        JobQueueFull: If too many jobs are already queued or running
+    """
+    job = IngestJob(kind, filename)
+    with _jobs_lock:
+        if sum(1 for existing in _jobs.values() if existing.pending) >= INGEST_MAX_PENDING_JOBS:
+            raise JobQueueFull(f"Ingestion queue is full ({INGEST_MAX_PENDING_JOBS} pending jobs)")
+        _jobs[job.id] = job
+        _prune_finished_jobs()
+
+    _get_executor().submit(_run_job, job, pipeline, on_success)
+    logger.info(f"Job {job.id} ({kind}) queued")
+    return job
+
+def get_job(job_id: str) -> Optional[IngestJob]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def list_jobs() -> List[IngestJob]:
+    with _jobs_lock:
+        return list(_jobs.values())
+
+def shutdown_workers(wait: bool = False):
+    """Stop the worker pool (pending jobs are cancelled unless wait=True)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=not wait)
+        _executor = None
@@ -0,0 +1,353 @@
+# LLM gateway service
+# Process-wide pooled LLM clients with rate limiting, adaptive concurrency and response caching
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from services.llm_cache import LLMResponseCache, get_llm_cache, LLM_CACHE_BYPASS
+
+# The openai package is imported on first use; it dominates the API's import time
+if TYPE_CHECKING:
+    from openai import RateLimitError
+
+logger = logging.getLogger(__name__)
+
+# "azure" (Azure OpenAI) or "openai" (any OpenAI-compatible server, e.g. a local stub via LLM_BASE_URL)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "azure")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "300"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "150000"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used for budgeting."""
+    return len(text) // 4 + 1
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most
+    one minute of capacity. Usable from threads and from coroutines.
+    """
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        """Take amount tokens (possibly going negative) and return how long to wait until they are covered."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def _refund(self, amount: float):
+        """Give back tokens reserved for a request that was never sent."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def acquire(self, amount: float = 1):
+        wait = self._reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount: float = 1):
+        wait = self._reserve(amount)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._refund(amount)
+                raise
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit: grows by one after a full window of successful
+    requests and halves whenever the provider answers 429.
+
+    Shared by worker threads and event loops: threads wait on the condition,
+    coroutines on a future of their own loop that release() resolves.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self.requests = 0
+        self._condition = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+            self.requests += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    self.requests += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._condition:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    @staticmethod
+    def _wake(waiter: asyncio.Future):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def release(self, rate_limited: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self.successes = 0
+                self.limit = max(self.minimum, self.limit // 2)
+                logger.warning(f"LLM provider rate limited us, concurrency limit lowered to {self.limit}")
+            else:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.successes = 0
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake, waiter)
+            except RuntimeError:  # the waiter's loop has been closed
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "concurrency_limit": self.limit,
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+            }
+
+def _azure_clients() -> Tuple[Callable[[], Any], Callable[[], Any]]:
+    settings = dict(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        max_retries=0,  # retries are handled by the gateway
+        timeout=LLM_TIMEOUT_SECONDS,
+    )
+    from openai import AzureOpenAI, AsyncAzureOpenAI
+    return lambda: AzureOpenAI(**settings), lambda: AsyncAzureOpenAI(**settings)
+
+def _openai_compatible_clients() -> Tuple[Callable[[], Any], Callable[[], Any]]:
+    settings = dict(
+        api_key=os.getenv("OPENAI_API_KEY", "local"),
+        base_url=LLM_BASE_URL,
+        max_retries=0,
+        timeout=LLM_TIMEOUT_SECONDS,
+    )
+    from openai import OpenAI, AsyncOpenAI
+    return lambda: OpenAI(**settings), lambda: AsyncOpenAI(**settings)
+
+# Backend name -> callable returning (sync client factory, async client factory)
+BACKENDS: Dict[str, Callable[[], Tuple[Callable[[], Any], Callable[[], Any]]]] = {
+    "azure": _azure_clients,
+    "openai": _openai_compatible_clients,
+}
+
+def register_backend(name: str, factory: Callable[[], Tuple[Callable[[], Any], Callable[[], Any]]]):
+    """Register a backend; factory returns (sync client factory, async client factory)."""
+    BACKENDS[name] = factory
+
+class LLMGateway:
+    """
+    Single entry point for chat completions.
+
+    Holds one keep-alive sync client per process and one async client per
+    event loop, a requests/tokens-per-minute budget and an adaptive
+    concurrency limit shared by every caller, plus the response cache.
+    """
+
+    def __init__(self, backend: str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown LLM backend '{backend}' (available: {', '.join(BACKENDS)})")
+        self.backend = backend
+        self._sync_factory, self._async_factory = BACKENDS[backend]()
+        self._sync_client = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        self._client_lock = threading.Lock()
+        self.request_bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+        self.token_bucket = TokenBucket(LLM_TOKENS_PER_MINUTE)
+        self.limiter = AdaptiveConcurrencyLimiter(LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY)
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._sync_client is None:
+                self._sync_client = self._sync_factory()
+            return self._sync_client
+
+    @property
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        with self._client_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = self._async_factory()
+            return client
+
+    @staticmethod
+    def _request_tokens(messages: List[Dict[str, str]], params: Dict[str, Any]) -> int:
+        prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+        return prompt_tokens + int(params.get("max_completion_tokens") or params.get("max_tokens") or 0)
+
+    @staticmethod
+    def _retry_after(error: "RateLimitError", attempt: int) -> float:
+        try:
+            return float(error.response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            return min(30.0, 0.5 * 2 ** attempt)
+
+    def _cache_lookup(self, deployment: str, messages, params, use_cache: bool):
+        if not use_cache or LLM_CACHE_BYPASS:
+            return None, None
+        cache = get_llm_cache()
+        key = LLMResponseCache.make_key(deployment, messages, params)
+        return cache, key
+
+    @staticmethod
+    def _cache_store(cache: Optional[LLMResponseCache], key: str, content: str, validate: Optional[Callable[[str], bool]]):
+        if not cache or not content:
+            return
+        if validate is not None and not validate(content):
+            logger.warning("LLM reply failed validation, not caching it")
+            return
+        cache.set(key, content)
+
+    def chat_completion(self, messages: List[Dict[str, str]], deployment: Optional[str] = None,
+                        use_cache: bool = True, validate: Optional[Callable[[str], bool]] = None, **params) -> str:
+        """
+        Return the message content of a chat completion.
+
+        Args:
+            messages: Chat messages
+            deployment: Model deployment (defaults to AZURE_OPENAI_DEPLOYMENT_NAME)
+            use_cache: Set to False to bypass the response cache for this call
+            validate: Check the reply must pass to be cached (e.g. it parses);
+                rejected replies are still returned, so retries ask the model again
+            **params: Extra completion parameters (part of the cache key)
+        """
+        deployment = deployment or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
+        cache, key = self._cache_lookup(deployment, messages, params, use_cache)
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        from openai import RateLimitError
+
+        client = self.client  # fail fast on configuration errors, before spending rate budget
+        tokens = self._request_tokens(messages, params)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(tokens)
+            self.limiter.acquire()
+            try:
+                response = client.chat.completions.create(model=deployment, messages=messages, **params)
+            except RateLimitError as e:
+                self.limiter.release(rate_limited=True)
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                time.sleep(self._retry_after(e, attempt))
+                continue
+            except Exception:
+                self.limiter.release()
+                raise
+            self.limiter.release()
+            break
+
+        content = response.choices[0].message.content or ""
+        self._cache_store(cache, key, content, validate)
+        return content
+
+    async def achat_completion(self, messages: List[Dict[str, str]], deployment: Optional[str] = None,
+                               use_cache: bool = True, validate: Optional[Callable[[str], bool]] = None, **params) -> str:
+        """Async variant of chat_completion sharing the same limits and cache."""
+        deployment = deployment or os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4")
+        cache, key = self._cache_lookup(deployment, messages, params, use_cache)
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        from openai import RateLimitError
+
+        client = self.async_client
+        tokens = self._request_tokens(messages, params)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self.request_bucket.acquire_async(1)
+            await self.token_bucket.acquire_async(tokens)
+            await self.limiter.acquire_async()
+            try:
+                response = await client.chat.completions.create(model=deployment, messages=messages, **params)
+            except RateLimitError as e:
+                self.limiter.release(rate_limited=True)
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(self._retry_after(e, attempt))
+                continue
+            except Exception:
+                self.limiter.release()
+                raise
+            self.limiter.release()
+            break
+
+        content = response.choices[0].message.content or ""
+        self._cache_store(cache, key, content, validate)
+        return content
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, **self.limiter.stats()}
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_llm_gateway() -> LLMGateway:
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(LLM_BACKEND)
+        return _gateway
+
+def chat_completion(messages: List[Dict[str, str]], deployment: Optional[str] = None,
+                    use_cache: bool = True, validate: Optional[Callable[[str], bool]] = None, **params) -> str:
+    return get_llm_gateway().chat_completion(messages, deployment, use_cache, validate, **params)
+
+async def achat_completion(messages: List[Dict[str, str]], deployment: Optional[str] = None,
+                           use_cache: bool = True, validate: Optional[Callable[[str], bool]] = None, **params) -> str:
+    return await get_llm_gateway().achat_completion(messages, deployment, use_cache, validate, **params)
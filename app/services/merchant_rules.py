@@ -0,0 +1,265 @@
+# Merchant rules service
+# Local rule-based categorization; the LLM is only consulted for unmatched descriptions
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from db.models import MerchantRule
+from services.categorizer import batch_categorize_transactions, VALID_CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the in-process index is reloaded from the merchant_rules table
+MERCHANT_RULES_REFRESH_SECONDS = int(os.getenv("MERCHANT_RULES_REFRESH_SECONDS", "300"))
+# Share of a merchant's categorized rows that must agree before a rule is learned
+MERCHANT_RULES_MIN_AGREEMENT = float(os.getenv("MERCHANT_RULES_MIN_AGREEMENT", "0.8"))
+# Ask the LLM for descriptions no rule matches
+MERCHANT_RULES_LLM_FALLBACK = os.getenv("MERCHANT_RULES_LLM_FALLBACK", "true").lower() == "true"
+
+# Built-in keyword rules; table rules with the same keyword take precedence
+DEFAULT_KEYWORD_RULES = {
+    "grocery": "Food", "supermarket": "Food", "restaurant": "Food", "cafe": "Food", "coffee": "Food",
+    "bakery": "Food", "pizza": "Food", "krabby patty": "Food",
+    "gas station": "Transportation", "fuel": "Transportation", "parking": "Transportation",
+    "uber": "Transportation", "lyft": "Transportation", "taxi": "Transportation", "car repair": "Transportation",
+    "car maintenance": "Transportation",
+    "cinema": "Entertainment", "movie": "Entertainment", "concert": "Entertainment", "entertainment": "Entertainment",
+    "utility": "Utilities", "electric": "Utilities", "water bill": "Utilities", "internet": "Utilities",
+    "rent": "Rent", "salary": "Salary", "payroll": "Salary",
+    "online purchase": "Shopping", "amazon": "Shopping",
+    "pharmacy": "Healthcare", "doctor": "Healthcare", "medical": "Healthcare", "dental": "Healthcare",
+    "hospital": "Healthcare",
+    "tuition": "Education", "school": "Education",
+    "airline": "Travel", "hotel": "Travel", "airbnb": "Travel",
+    "insurance": "Insurance",
+    "subscription": "Subscriptions", "netflix": "Subscriptions", "spotify": "Subscriptions", "gym": "Subscriptions",
+}
+
+_NOISE_RE = re.compile(r"[^a-z&' ]+")
+
+def normalize_description(description: str) -> str:
+    """Lowercase, drop digits and punctuation (store numbers, references) and collapse whitespace."""
+    return " ".join(_NOISE_RE.sub(" ", str(description).lower()).split())
+
+class MerchantRuleIndex:
+    """
+    Compiled rule matcher.
+
+    Exact rules are a dict keyed by normalized description; keyword rules
+    are compiled into one alternation regex (longest keyword first) so a
+    lookup is one hash probe plus at most one regex search. Results for raw
+    descriptions are memoized, so repeat merchants cost a single dict hit.
+    """
+
+    MEMO_SIZE = 100_000
+
+    def __init__(self, exact: Dict[str, str], keywords: Dict[str, str]):
+        self.exact = dict(exact)
+        self.keywords = dict(keywords)
+        self._memo: Dict[str, Optional[str]] = {}
+        self._compile()
+
+    def _compile(self):
+        if self.keywords:
+            alternation = "|".join(re.escape(keyword) for keyword in sorted(self.keywords, key=len, reverse=True))
+            self._keyword_re = re.compile(rf"\b(?:{alternation})\b")
+        else:
+            self._keyword_re = None
+
+    def lookup(self, description: str) -> Optional[str]:
+        try:
+            return self._memo[description]
+        except KeyError:
+            pass
+        key = normalize_description(description)
+        category = self.exact.get(key)
+        if category is None and self._keyword_re is not None:
+            match = self._keyword_re.search(key)
+            category = self.keywords[match.group(0)] if match else None
+        if len(self._memo) >= self.MEMO_SIZE:
+            self._memo.clear()
+        self._memo[description] = category
+        return category
+
+    def add_exact(self, key: str, category: str):
+        self.exact[key] = category
+        self._memo.clear()
+
+    def __len__(self):
+        return len(self.exact) + len(self.keywords)
+
+_index: Optional[MerchantRuleIndex] = None
+_index_loaded_at = 0.0
+_index_lock = threading.Lock()
+
+def load_rule_index(db: Session) -> MerchantRuleIndex:
+    """Build a fresh index from DEFAULT_KEYWORD_RULES and the merchant_rules table."""
+    exact: Dict[str, str] = {}
+    keywords: Dict[str, str] = dict(DEFAULT_KEYWORD_RULES)
+    for pattern, match_type, category in db.query(MerchantRule.pattern, MerchantRule.match_type, MerchantRule.category):
+        (keywords if match_type == "keyword" else exact)[pattern] = category
+    return MerchantRuleIndex(exact, keywords)
+
+def get_rule_index(db: Session) -> MerchantRuleIndex:
+    """Process-wide index, reloaded every MERCHANT_RULES_REFRESH_SECONDS."""
+    global _index, _index_loaded_at
+    with _index_lock:
+        if _index is None or time.time() - _index_loaded_at > MERCHANT_RULES_REFRESH_SECONDS:
+            _index = load_rule_index(db)
+            _index_loaded_at = time.time()
+            logger.info(f"Loaded {len(_index)} merchant rules")
+        return _index
+
+def save_rules(db: Session, rules: Iterable[Tuple[str, str, str]], source: str) -> int:
+    """
+    Upsert (pattern, match_type, category) rules. Manual rules are never
+    overwritten by learned or LLM rules.
+    """
+    values = [
+        {"pattern": pattern, "match_type": match_type, "category": category, "source": source}
+        for pattern, match_type, category in rules
+    ]
+    if not values:
+        return 0
+    stmt = pg_insert(MerchantRule).values(values)
+    stmt = stmt.on_conflict_do_update(
+        constraint="unique_merchant_rule",
+        set_={"category": stmt.excluded.category, "source": stmt.excluded.source, "updated_at": func.now()},
+        where=MerchantRule.source != "manual" if source != "manual" else None,
+    )
+    db.execute(stmt)
+    db.commit()
+    return len(values)
+
+def learn_rules_from_transactions(db: Session) -> int:
+    """
+    Learn exact-match rules from already categorized rows of the transactions table.
+
+    A normalized description becomes a rule when at least
+    MERCHANT_RULES_MIN_AGREEMENT of its categorized rows share one category.
+
+    Returns the number of rules learned.
+    """
+    counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    rows = db.execute(text("""
+        SELECT description, category, count(*)
+        FROM transactions
+        WHERE category IS NOT NULL AND category <> 'Uncategorized'
+        GROUP BY description, category
+    """))
+    for description, category, count in rows:
+        if category in VALID_CATEGORIES:
+            counts[normalize_description(description)][category] += count
+
+    learned = []
+    for key, categories in counts.items():
+        if not key:
+            continue
+        category, count = max(categories.items(), key=lambda item: item[1])
+        if count / sum(categories.values()) >= MERCHANT_RULES_MIN_AGREEMENT:
+            learned.append((key, "exact", category))
+
+    save_rules(db, learned, "learned")
+    _invalidate_index()
+    logger.info(f"Learned {len(learned)} merchant rules from categorized transactions")
+    return len(learned)
+
+def add_manual_rule(db: Session, pattern: str, match_type: str, category: str):
+    """Add or replace a manual rule and reload the index on next use."""
+    save_rules(db, [(pattern, match_type, category)], "manual")
+    _invalidate_index()
+
+def _invalidate_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+def _needs_category(category: Any) -> bool:
+    return category is None or category != category or category in ("", "Uncategorized")
+
+def categorize_transactions(db: Session, transactions: List[Dict[str, Any]],
+                            use_llm: bool = MERCHANT_RULES_LLM_FALLBACK) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Fill in missing categories, matching rules first and asking the LLM only for misses.
+
+    LLM answers are saved as exact rules so the same merchant never reaches
+    the model again.
+
+    Returns (transactions, stats) where stats counts rule hits and LLM lookups.
+    """
+    index = get_rule_index(db)
+    result = []
+    misses: List[int] = []
+    rule_hits = 0
+    for tx in transactions:
+        if _needs_category(tx.get("category")):
+            category = index.lookup(tx["description"])
+            tx = {**tx, "category": category or "Uncategorized"}
+            if category is None:
+                misses.append(len(result))
+            else:
+                rule_hits += 1
+        result.append(tx)
+
+    stats = {"rule_hits": rule_hits, "llm_categorized": 0}
+    if not misses or not use_llm:
+        return result, stats
+
+    categorized = batch_categorize_transactions([result[position] for position in misses])
+    learned = {}
+    for position, tx in zip(misses, categorized):
+        result[position] = tx
+        if tx["category"] in VALID_CATEGORIES:
+            key = normalize_description(tx["description"])
+            if key:
+                learned[key] = tx["category"]
+                index.add_exact(key, tx["category"])
+    stats["llm_categorized"] = len(misses)
+
+    try:
+        save_rules(db, [(key, "exact", category) for key, category in learned.items()], "llm")
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Could not save LLM-learned merchant rules: {e}")
+    return result, stats
+
+def categorize_frame(db: Session, frame, use_llm: bool = MERCHANT_RULES_LLM_FALLBACK):
+    """
+    Fill in missing categories of a column batch (see iter_csv_chunks).
+
+    Only distinct (description, sign) pairs without a category are looked up.
+
+    Returns (frame, stats).
+    """
+    missing = frame["category"].isna() | frame["category"].isin(["", "Uncategorized"])
+    if not missing.any():
+        return frame, {"rule_hits": 0, "llm_categorized": 0}
+
+    pending = frame.loc[missing, ["description", "amount"]]
+    pending = pending.assign(income=pending["amount"] > 0)
+    distinct = pending.drop_duplicates(["description", "income"])
+    categorized, stats = categorize_transactions(
+        db,
+        [{"description": description, "amount": amount} for description, amount in zip(distinct["description"], distinct["amount"])],
+        use_llm=use_llm,
+    )
+    mapping = {(tx["description"], tx["amount"] > 0): tx["category"] for tx in categorized}
+    frame = frame.copy()
+    frame.loc[missing, "category"] = [mapping[key] for key in zip(pending["description"], pending["income"])]
+    return frame, stats
+
+def list_rules(db: Session) -> List[Dict[str, Any]]:
+    rules = db.query(MerchantRule).order_by(MerchantRule.match_type, MerchantRule.pattern).all()
+    return [
+        {"pattern": rule.pattern, "match_type": rule.match_type, "category": rule.category, "source": rule.source}
+        for rule in rules
+    ]
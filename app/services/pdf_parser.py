@@ -1,35 +1,119 @@
-import pdfplumber
 import io
+import os
 import logging
+import time
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from services.table_extractor import extract_page_transactions
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_pdf(content) -> str:
+# Worker processes used for page layout analysis
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# Pages handled per worker task (each task opens the document once)
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "4"))
+# Documents with fewer pages are extracted in-process; not worth the IPC
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+
+_extract_pool: Optional[ProcessPoolExecutor] = None
+
+class PdfExtractionError(Exception):
+    """A page extraction worker failed; the message names the pages it held."""
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    if _extract_pool is None:
+        # spawn: the API process is multi-threaded, forking it is unsafe
+        _extract_pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _extract_pool
+
+def shutdown_extract_pool():
+    """Stop the page extraction worker processes."""
+    global _extract_pool
+    if _extract_pool is not None:
+        _extract_pool.shutdown(wait=False, cancel_futures=True)
+        _extract_pool = None
+
+def _extract_page_range(source: Union[bytes, str], start: int, stop: int, parse_tables: bool) -> List[Dict[str, Any]]:
+    """
+    Extract pages [start, stop) (0-based) of a PDF given as bytes or a file
+    path, calling extract_text once per page. With parse_tables, also run
+    the deterministic table extractor on each page.
+    """
+    import pdfplumber
+    results = []
+    with pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source, pages=list(range(start + 1, stop + 1))) as pdf:
+        for page in pdf.pages:
+            started = time.perf_counter()
+            text = page.extract_text() or ""
+            extraction = extract_page_transactions(page, text) if parse_tables else None
+            results.append({
+                "text": text,
+                "extraction": extraction,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            })
+    return results
+
+def iter_pdf_page_extracts(content: bytes, parse_tables: bool = True) -> Iterator[Dict[str, Any]]:
     """
-    Extract text from PDF content
+    Extract pages, sharding them across a process pool.
+
+    Results are yielded in page order as soon as the shard holding a page is
+    done, so callers can start on page 1 while later pages are still being
+    extracted. Workers read the document from a temporary file rather than
+    each receiving a pickled copy of the bytes.
 
     Args:
         content: PDF file content as bytes
+        parse_tables: Also parse transactions from table/word geometry
 
-    Returns:
-        Extracted text as string
-    """
-    logger.info("Starting PDF text extraction process")
+    Yields:
+        Dicts with page (starting at 1), text, extraction and duration_ms
 
-    try:
-        # Extract text from PDF
-        with pdfplumber.open(io.BytesIO(content)) as pdf:
-            text = "\n".join([page.extract_text() for page in pdf.pages if page.extract_text()])
+    Raises:
+        PdfExtractionError: When a worker fails (chained to the worker's exception)
+    """
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(content)) as pdf:
+        page_count = len(pdf.pages)
 
-        if not text.strip():
-            logger.warning("No text content found in PDF")
-            return ""
+    if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_WORKERS <= 1:
+        for page_number, page in enumerate(_extract_page_range(content, 0, page_count, parse_tables), start=1):
+            yield {"page": page_number, **page}
+        return
 
-        logger.info(f"Extracted {len(text)} characters from PDF")
-        return text
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spool:
+        spool.write(content)
+    shards = []
+    try:
+        pool = _get_extract_pool()
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            stop = min(start + PDF_PAGES_PER_TASK, page_count)
+            shards.append((start, stop, pool.submit(_extract_page_range, spool.name, start, stop, parse_tables)))
 
-    except Exception as e:
-        logger.error(f"PDF text extraction failed: {e}")
-        return ""
+        for start, stop, shard in shards:
+            try:
+                pages = shard.result()
+            except Exception as e:
+                logger.error(f"PDF page extraction failed for pages {start + 1}-{stop}: {e!r}")
+                if isinstance(e, BrokenProcessPool):
+                    shutdown_extract_pool()  # a broken pool rejects all further work; start a fresh one next time
+                raise PdfExtractionError(f"Extraction of pages {start + 1}-{stop} failed: {e!r}") from e
+            for page_number, page in enumerate(pages, start=start + 1):
+                yield {"page": page_number, **page}
+    finally:
+        for _, _, shard in shards:
+            shard.cancel()
+        try:
+            os.remove(spool.name)
+        except OSError as e:  # still open in a worker on Windows
+            logger.warning(f"Could not remove PDF spool file {spool.name}: {e}")
@@ -0,0 +1,92 @@
+# Snapshot service
+# Versioned in-memory column snapshot of the transactions table shared by the insight functions
+
+import logging
+import threading
+from typing import TYPE_CHECKING, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db.data_version import read_data_version
+from db.models import Transaction
+
+# pandas is imported on first use rather than with the API
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_COLUMNS = ["id", "date", "description", "amount", "category"]
+
+def _empty_frame() -> "pd.DataFrame":
+    import pandas as pd
+    return pd.DataFrame({
+        "id": pd.Series(dtype="int64"),
+        "date": pd.Series(dtype="datetime64[ns]"),
+        "description": pd.Series(dtype="object"),
+        "amount": pd.Series(dtype="float64"),
+        "category": pd.Series(dtype="object"),
+    })
+
+def _load_rows(db: Session, after_id: int) -> "pd.DataFrame":
+    """Fetch rows with id > after_id as a typed frame (plain tuples, no ORM objects)."""
+    import pandas as pd
+    rows = db.execute(
+        select(Transaction.id, Transaction.date, Transaction.description, Transaction.amount, Transaction.category)
+        .where(Transaction.id > after_id)
+        .order_by(Transaction.id)
+    ).all()
+    if not rows:
+        return _empty_frame()
+    frame = pd.DataFrame.from_records(rows, columns=SNAPSHOT_COLUMNS)
+    return frame.astype({"id": "int64", "date": "datetime64[ns]", "amount": "float64", "description": "object", "category": "object"})
+
+class TransactionSnapshot:
+    """
+    Column-typed copy of the transactions table tagged with the data version.
+
+    On access the stored version is compared with data_version: unchanged
+    means no query at all, a newer version appends only rows with a higher
+    id (ingest is append-only and serialized, see db/data_version.py), and a
+    newer reset_version triggers a full reload. The frame is None until the
+    first refresh, which always loads.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.version = -1
+        self.reset_version = -1
+        self.max_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, db: Session) -> "pd.DataFrame":
+        import pandas as pd
+        with self._lock:
+            version, reset_version = read_data_version(db)
+            if version == self.version:
+                return self.frame
+            if reset_version != self.reset_version:
+                self.frame = _load_rows(db, 0)
+                logger.info(f"Loaded transaction snapshot v{version} ({len(self.frame)} rows)")
+            else:
+                new_rows = _load_rows(db, self.max_id)
+                if not new_rows.empty:
+                    self.frame = pd.concat([self.frame, new_rows], ignore_index=True)
+                logger.info(f"Appended {len(new_rows)} rows to transaction snapshot v{version}")
+            if not self.frame.empty:
+                self.max_id = int(self.frame["id"].iloc[-1])
+            self.version, self.reset_version = version, reset_version
+            return self.frame
+
+_snapshot = TransactionSnapshot()
+
+def get_transactions_frame(db: Session, columns: Optional[List[str]] = None) -> "pd.DataFrame":
+    """
+    Current transactions as a DataFrame.
+
+    The frame is shared between callers; the result is a copy-on-write view,
+    so adding or overwriting columns never touches the snapshot.
+    """
+    frame = _snapshot.refresh(db)
+    return frame[columns] if columns else frame.copy(deep=False)
@@ -0,0 +1,219 @@
+# Table extractor service
+# Deterministic transaction extraction from pdfplumber table and word geometry
+
+import os
+import re
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Share of date-led rows that must parse for a page to skip the LLM
+TABLE_EXTRACT_MIN_CONFIDENCE = float(os.getenv("TABLE_EXTRACT_MIN_CONFIDENCE", "0.9"))
+
+_DATE_FORMATS = [
+    "%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%d.%m.%Y",
+    "%b %d %Y", "%b %d, %Y", "%d %b %Y", "%B %d %Y", "%B %d, %Y", "%d %B %Y",
+]
+_YEARLESS_DATE_FORMATS = ["%m/%d", "%b %d", "%d %b", "%B %d", "%d %B"]
+
+_DATE_RE = re.compile(
+    r"^(?:\d{4}-\d{1,2}-\d{1,2}"
+    r"|\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?"
+    r"|[A-Za-z]{3,9}\.? \d{1,2}(?:,? \d{4})?"
+    r"|\d{1,2} [A-Za-z]{3,9}\.?(?: \d{4})?)$"
+)
+_AMOUNT_RE = re.compile(r"^(\()?([-+])?\$?\s?([-+])?(\d{1,3}(?:,\d{3})*|\d+)\.(\d{2})(\))?\s?(CR|DR|-)?$", re.IGNORECASE)
+_YEAR_RE = re.compile(r"\b(19\d{2}|20\d{2})\b")
+
+# Lines with amounts that are statement metadata rather than transactions
+_SUMMARY_KEYWORDS = ("balance", "total", "minimum payment", "credit limit", "payment due", "available credit")
+_SUMMARY_RE = re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in _SUMMARY_KEYWORDS) + r")\b", re.IGNORECASE)
+
+_HEADER_ALIASES = {
+    "date": ("date", "posting date", "post date", "transaction date", "trans date"),
+    "description": ("description", "details", "merchant", "payee", "transaction", "memo", "narrative"),
+    "amount": ("amount", "value"),
+    "debit": ("debit", "withdrawal", "withdrawals", "money out"),
+    "credit": ("credit", "deposit", "deposits", "money in"),
+}
+
+def parse_statement_date(value: str, default_year: Optional[int] = None) -> Optional[str]:
+    """Parse a statement date cell into YYYY-MM-DD, or None if it is not a date."""
+    value = " ".join((value or "").split())
+    if value[:1].isalpha():
+        value = value.replace(".", "")
+    if not value or not _DATE_RE.match(value):
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    if default_year:
+        for fmt in _YEARLESS_DATE_FORMATS:
+            try:
+                return datetime.strptime(f"{value} {default_year}", f"{fmt} %Y").strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    return None
+
+def parse_statement_amount(value: str) -> Optional[float]:
+    """Parse amounts such as "$-10.00", "-$1,234.56", "(45.00)" or "12.00 CR"."""
+    match = _AMOUNT_RE.match((value or "").strip())
+    if not match:
+        return None
+    open_paren, sign, inner_sign, whole, cents, close_paren, suffix = match.groups()
+    amount = float(f"{whole.replace(',', '')}.{cents}")
+    negative = "-" in (sign or "", inner_sign or "") or (open_paren and close_paren) or (suffix or "").upper() in ("DR", "-")
+    return -amount if negative else amount
+
+def _find_header(rows: List[List[str]]) -> Optional[Dict[str, Any]]:
+    """Locate a header row and map column roles to indexes."""
+    for index, row in enumerate(rows[:5]):
+        columns = {}
+        for position, cell in enumerate(row):
+            label = (cell or "").strip().lower()
+            for role, aliases in _HEADER_ALIASES.items():
+                if role not in columns and label in aliases:
+                    columns[role] = position
+        if "date" in columns and ("amount" in columns or "debit" in columns or "credit" in columns):
+            return {"row": index, "columns": columns}
+    return None
+
+def _cell(cells: List[str], columns: Dict[str, int], role: str) -> str:
+    """Cell of the given header role, or "" when the column is unknown or the row is too short (ragged tables)."""
+    position = columns.get(role)
+    return cells[position] if position is not None and position < len(cells) else ""
+
+def _row_to_transaction(cells: List[str], header: Optional[Dict[str, Any]], default_year: Optional[int]):
+    """
+    Convert one row of cells into a transaction.
+
+    Returns (is_candidate, transaction): a row is a candidate when it starts
+    with a date; transaction is None when it could not be fully parsed.
+    """
+    cells = [(cell or "").replace("\n", " ").strip() for cell in cells]
+
+    if header:
+        columns = header["columns"]
+        date = parse_statement_date(_cell(cells, columns, "date"), default_year)
+        if date is None:
+            return False, None
+        if "amount" in columns:
+            amount = parse_statement_amount(_cell(cells, columns, "amount"))
+        else:
+            debit_cell, credit_cell = _cell(cells, columns, "debit"), _cell(cells, columns, "credit")
+            debit = parse_statement_amount(debit_cell) if debit_cell else None
+            credit = parse_statement_amount(credit_cell) if credit_cell else None
+            amount = -abs(debit) if debit is not None else (abs(credit) if credit is not None else None)
+        if "description" in columns:
+            description = _cell(cells, columns, "description")
+        else:
+            used = {columns[role] for role in columns}
+            description = " ".join(cell for position, cell in enumerate(cells) if position not in used and cell)
+    else:
+        values = [cell for cell in cells if cell]
+        if not values:
+            return False, None
+        date = parse_statement_date(values[0], default_year)
+        if date is None:
+            return False, None
+        amount_index = next((i for i in range(len(values) - 1, 0, -1) if parse_statement_amount(values[i]) is not None), None)
+        if amount_index is None:
+            return True, None
+        amount = parse_statement_amount(values[amount_index])
+        description = " ".join(values[1:amount_index])
+
+    if amount is None or not description:
+        return True, None
+    return True, {"date": date, "description": description, "amount": amount}
+
+def _rows_from_words(page) -> List[List[str]]:
+    """Group words into visual lines and split each line into date / description / amount cells."""
+    lines: List[List[Dict[str, Any]]] = []
+    for word in sorted(page.extract_words(keep_blank_chars=False), key=lambda w: (round(w["top"]), w["x0"])):
+        if lines and abs(lines[-1][0]["top"] - word["top"]) <= 3:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+
+    rows = []
+    for line in lines:
+        tokens = [word["text"] for word in sorted(line, key=lambda w: w["x0"])]
+        # Dates may span up to three tokens ("Jan 05, 2024")
+        for width in (3, 2, 1):
+            if len(tokens) > width and _DATE_RE.match(" ".join(tokens[:width])):
+                rows.append([" ".join(tokens[:width])] + tokens[width:])
+                break
+        else:
+            rows.append(tokens)
+    return rows
+
+def _has_unclaimed_amounts(text: str) -> bool:
+    """True if the page shows amounts outside of summary lines (possible transactions we did not recognise)."""
+    for line in (text or "").splitlines():
+        if _SUMMARY_RE.search(line):
+            continue
+        if any(parse_statement_amount(token) is not None for token in line.split()):
+            return True
+    return False
+
+def _parse_rows(rows: List[List[str]], header: Optional[Dict[str, Any]], default_year: Optional[int]):
+    transactions = []
+    candidates = 0
+    start = header["row"] + 1 if header else 0
+    for cells in rows[start:]:
+        # Dated balance and total lines are neither transactions nor missed candidates
+        if _SUMMARY_RE.search(" ".join(cell or "" for cell in cells)):
+            continue
+        is_candidate, transaction = _row_to_transaction(cells, header, default_year)
+        candidates += is_candidate
+        if transaction:
+            transactions.append(transaction)
+    return transactions, candidates
+
+def extract_page_transactions(page, text: str) -> Dict[str, Any]:
+    """
+    Extract transactions from a pdfplumber page without calling the LLM.
+
+    Tables detected by pdfplumber are tried first; otherwise words are
+    grouped into lines by position. A page is parsed locally only when at
+    least TABLE_EXTRACT_MIN_CONFIDENCE of its date-led rows parse cleanly.
+
+    Args:
+        page: pdfplumber page
+        text: Page text (already extracted) used for year detection
+
+    Returns:
+        Dict with "path" ("table", "words", "empty" or "llm"), "transactions",
+        "candidates" and "confidence"
+    """
+    year_match = _YEAR_RE.search(text or "")
+    default_year = int(year_match.group(1)) if year_match else None
+
+    transactions, candidates, path = [], 0, "table"
+    for table in page.extract_tables():
+        rows = [list(row) for row in table if row]
+        table_transactions, table_candidates = _parse_rows(rows, _find_header(rows), default_year)
+        transactions.extend(table_transactions)
+        candidates += table_candidates
+
+    if candidates == 0:
+        path = "words"
+        transactions, candidates = _parse_rows(_rows_from_words(page), None, default_year)
+
+    if candidates == 0:
+        path = "llm" if _has_unclaimed_amounts(text) else "empty"
+        return {"path": path, "transactions": [], "candidates": 0, "confidence": 0.0}
+
+    confidence = len(transactions) / candidates
+    if confidence < TABLE_EXTRACT_MIN_CONFIDENCE:
+        path = "llm"
+    return {
+        "path": path,
+        "transactions": transactions if path != "llm" else [],
+        "candidates": candidates,
+        "confidence": round(confidence, 3),
+    }
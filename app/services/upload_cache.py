@@ -0,0 +1,103 @@
+# Upload cache service
+# Content-addressed registry of processed statements so re-uploads skip parsing and AI
+
+import os
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, defer
+
+from db.models import ProcessedFile
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of cached uploads; least recently used entries are evicted
+UPLOAD_CACHE_MAX_ENTRIES = int(os.getenv("UPLOAD_CACHE_MAX_ENTRIES", "500"))
+
+def compute_content_hash(content: bytes) -> str:
+    """SHA-256 hex digest of the uploaded bytes."""
+    return hashlib.sha256(content).hexdigest()
+
+def _entry_to_dict(entry: ProcessedFile) -> Dict[str, Any]:
+    return {
+        "sha256": entry.sha256,
+        "kind": entry.kind,
+        "filename": entry.filename,
+        "size_bytes": entry.size_bytes,
+        "transaction_count": entry.transaction_count,
+        "hits": entry.hits,
+        "created_at": entry.created_at.isoformat() if entry.created_at else None,
+        "last_used_at": entry.last_used_at.isoformat() if entry.last_used_at else None,
+    }
+
+def get_cached_transactions(db: Session, digest: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Look up the transactions extracted from a byte-identical upload.
+
+    Records the hit and refreshes the entry's recency. Returns None on a miss.
+    """
+    entry = db.get(ProcessedFile, digest)
+    if entry is None:
+        return None
+    entry.hits += 1
+    entry.last_used_at = func.now()
+    db.commit()
+    logger.info(f"Upload cache hit for {digest[:12]} ({entry.transaction_count} transactions)")
+    return entry.transactions
+
+def store_transactions(db: Session, digest: str, kind: str, filename: Optional[str], size_bytes: int,
+                       transactions: List[Dict[str, Any]]):
+    """Register the transactions extracted from an upload and evict beyond UPLOAD_CACHE_MAX_ENTRIES."""
+    values = {
+        "sha256": digest,
+        "kind": kind,
+        "filename": filename,
+        "size_bytes": size_bytes,
+        "transaction_count": len(transactions),
+        "transactions": transactions,
+        "hits": 0,
+    }
+    stmt = pg_insert(ProcessedFile).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProcessedFile.sha256],
+        set_={
+            "filename": stmt.excluded.filename,
+            "transaction_count": stmt.excluded.transaction_count,
+            "transactions": stmt.excluded.transactions,
+            "last_used_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+    _evict_excess(db)
+    db.commit()
+
+def _evict_excess(db: Session):
+    """Delete the least recently used entries beyond the size bound."""
+    stale = (
+        db.query(ProcessedFile.sha256)
+        .order_by(ProcessedFile.last_used_at.desc())
+        .offset(UPLOAD_CACHE_MAX_ENTRIES)
+        .subquery()
+    )
+    evicted = db.query(ProcessedFile).filter(ProcessedFile.sha256.in_(db.query(stale.c.sha256))).delete(synchronize_session=False)
+    if evicted:
+        logger.info(f"Evicted {evicted} upload cache entries")
+
+def list_cached_uploads(db: Session) -> List[Dict[str, Any]]:
+    entries = db.query(ProcessedFile).options(defer(ProcessedFile.transactions)).order_by(ProcessedFile.last_used_at.desc()).all()
+    return [_entry_to_dict(entry) for entry in entries]
+
+def evict_cached_upload(db: Session, digest: str) -> bool:
+    """Remove one entry; returns False if it did not exist."""
+    deleted = db.query(ProcessedFile).filter(ProcessedFile.sha256 == digest).delete(synchronize_session=False)
+    db.commit()
+    return deleted > 0
+
+def clear_upload_cache(db: Session) -> int:
+    """Remove all entries; returns the number removed."""
+    deleted = db.query(ProcessedFile).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -0,0 +1,105 @@
+"""
+Benchmark: a fresh client per request vs. the pooled LLM gateway (sync and async).
+
+Starts benchmarks/llm_stub_server.py in-process on a free port, so no Azure
+credentials are needed. The LLM response cache is bypassed.
+
+Usage:
+    python benchmarks/bench_llm_gateway.py --requests 200 --latency-ms 50 --stub-max-concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "app"))
+sys.path.insert(0, BENCH_DIR)
+
+from llm_stub_server import create_app  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(port, latency_ms, max_concurrency):
+    config = uvicorn.Config(create_app(latency_ms, 0.0, max_concurrency), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def messages(i):
+    return [{"role": "user", "content": f"Categorize this financial transaction: Merchant {i}"}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--stub-max-concurrency", type=int, default=8, help="stub answers 429 above this")
+    args = parser.parse_args()
+
+    port = free_port()
+    os.environ.update({
+        "LLM_BACKEND": "openai",
+        "LLM_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "LLM_CACHE_BYPASS": "true",
+        "LLM_MAX_CONCURRENCY": str(args.threads),
+        "LLM_REQUESTS_PER_MINUTE": "1000000",
+        "LLM_TOKENS_PER_MINUTE": "100000000",
+    })
+    from openai import OpenAI, RateLimitError
+    from services.llm_gateway import get_llm_gateway
+
+    server = start_stub(port, args.latency_ms, args.stub_max_concurrency)
+
+    def fresh_client_request(i):
+        # Baseline: what ai_parser/categorizer did before the gateway
+        client = OpenAI(api_key="local", base_url=os.environ["LLM_BASE_URL"])
+        try:
+            client.chat.completions.create(model="stub", messages=messages(i))
+            return True
+        except RateLimitError:
+            return False
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        succeeded = sum(executor.map(fresh_client_request, range(args.requests)))
+    baseline = time.perf_counter() - start
+    print(f"fresh client:   {baseline:.2f}s  {args.requests / baseline:8.1f} req/s  failed {args.requests - succeeded}")
+
+    gateway = get_llm_gateway()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(lambda i: gateway.chat_completion(messages(i), "stub"), range(args.requests)))
+    pooled = time.perf_counter() - start
+    print(f"gateway sync:   {pooled:.2f}s  {args.requests / pooled:8.1f} req/s  {gateway.stats()}")
+
+    async def run_async():
+        await asyncio.gather(*(gateway.achat_completion(messages(i), "stub") for i in range(args.requests)))
+
+    start = time.perf_counter()
+    asyncio.run(run_async())
+    pooled_async = time.perf_counter() - start
+    print(f"gateway async:  {pooled_async:.2f}s  {args.requests / pooled_async:8.1f} req/s  {gateway.stats()}")
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
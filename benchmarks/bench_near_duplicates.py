@@ -0,0 +1,58 @@
+"""
+Benchmark: near-duplicate detection cost as the table grows.
+
+Runs find_near_duplicates in memory over synthetic transactions (no
+database needed), sorted the way the batch scan streams them. A share of
+rows is re-added with reformatted descriptions and a shifted date, the way
+a second statement source would import them. With blocking on amount and a
+date window the time per row should stay flat as --rows grows.
+
+Usage:
+    python benchmarks/bench_near_duplicates.py --rows 100000 1000000 --duplicates 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from services.duplicates import _to_row, find_near_duplicates  # noqa: E402
+
+MERCHANTS = ["Starbucks", "Shell Oil", "Amazon Marketplace", "Whole Foods Market", "Uber Trip", "Netflix",
+             "Trader Joe's", "Home Depot", "Chevron", "Walgreens", "Target", "Costco Wholesale"]
+
+
+def generate(rows, duplicate_ratio):
+    rng = random.Random(0)
+    start = date(2015, 1, 1)
+    data = []
+    for i in range(rows):
+        merchant = rng.choice(MERCHANTS)
+        row = (i, start + timedelta(days=rng.randint(0, 3650)), -round(rng.uniform(1, 300), 2), f"{merchant} #{rng.randint(100, 9999)}")
+        data.append(row)
+        if rng.random() < duplicate_ratio:
+            data.append((rows + i, row[1] + timedelta(days=rng.randint(0, 2)), row[2], f"{merchant.upper()}  {rng.randint(100, 9999)} CA"))
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--duplicates", type=float, default=0.05, help="share of rows imported a second time")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        data = sorted(generate(rows, args.duplicates), key=lambda row: (row[2], row[1], row[0]))
+        started = time.perf_counter()
+        pairs = find_near_duplicates(_to_row(*row) for row in data)
+        elapsed = time.perf_counter() - started
+        true_pairs = sum(1 for newer, older, _ in pairs if newer - older == rows)
+        print(f"rows={len(data):9d} time={elapsed:7.2f}s per_row={elapsed / len(data) * 1e6:6.1f}us "
+              f"flagged={len(pairs):7d} planted_found={true_pairs}")
+
+
+if __name__ == "__main__":
+    main()
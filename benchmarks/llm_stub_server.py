@@ -0,0 +1,86 @@
+"""
+Local OpenAI-compatible stub standing in for Azure OpenAI in tests and benchmarks.
+
+Answers /v1/chat/completions after a configurable latency and rejects a
+share of requests (or everything above a concurrency cap) with 429 and a
+Retry-After header, so the gateway's limits can be exercised offline.
+
+Usage:
+    python benchmarks/llm_stub_server.py --port 8900 --latency-ms 200 --max-concurrency 8
+
+    LLM_BACKEND=openai LLM_BASE_URL=http://127.0.0.1:8900/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency_ms, rate_limit_ratio, max_concurrency):
+    app = FastAPI()
+    state = {"in_flight": 0, "requests": 0, "rejected": 0}
+
+    def reply(body, content):
+        return {
+            "id": f"stub-{state['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def answer(body):
+        """Canned answers matching the prompts of ai_parser and categorizer."""
+        prompt = body["messages"][-1]["content"]
+        if "one JSON object per line):\n" in prompt:
+            items = [json.loads(line) for line in prompt.split("one JSON object per line):\n")[1].strip().splitlines()]
+            return json.dumps({"results": [{"id": item["id"], "category": "Other"} for item in items]})
+        if "Extract all transactions" in prompt:
+            return json.dumps([{"date": "2024-01-01", "description": "Stub Merchant", "amount": -1.0, "category": "Other"}])
+        return "Other"
+
+    @app.post("/v1/chat/completions")
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state["requests"] += 1
+        if state["in_flight"] >= max_concurrency or random.random() < rate_limit_ratio:
+            state["rejected"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit", "code": "429"}},
+                status_code=429,
+                headers={"Retry-After": "0.2"},
+            )
+        state["in_flight"] += 1
+        try:
+            await asyncio.sleep(latency_ms / 1000)
+            return reply(body, answer(body))
+        finally:
+            state["in_flight"] -= 1
+
+    @app.get("/stats")
+    async def stats():
+        return state
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--max-concurrency", type=int, default=1000, help="requests above this are answered with 429")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.rate_limit_ratio, args.max_concurrency), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -42,7 +42,7 @@ def fetch_all_data():
                 'summary': executor.submit(requests.get, f"{API_URL}/insights/summary", timeout=30),
                 'categories': executor.submit(requests.get, f"{API_URL}/insights/categories", timeout=30),
                 'monthly': executor.submit(requests.get, f"{API_URL}/insights/monthly", timeout=30),
-                'transactions': executor.submit(requests.get, f"{API_URL}/transactions", timeout=30)
+                'transactions': executor.submit(requests.get, f"{API_URL}/transactions", params={"limit": 10, "sort": "date_desc"}, timeout=30)
             }
             
             # Collect results
@@ -91,7 +91,7 @@ def _get_empty_data(data_type: str) -> Any:
         'summary': {"total_income": 0, "total_expenses": 0, "balance": 0, "transactions": 0},
         'categories': [],
         'monthly': [],
-        'transactions': {"transactions": [], "total": 0},
+        'transactions': {"transactions": [], "next_cursor": None, "count": 0},
         'recurring': [],
         'anomalies': [],
         'forecast': {"forecast": None, "message": "Unable to fetch forecast"}
@@ -175,7 +175,7 @@ with col2:
 # Recent transactions preview
 if transactions_data.get('transactions'):
     st.subheader("📋 Recent Transactions")
-    recent_df = pd.DataFrame(transactions_data['transactions'][-10:])  # Last 10 transactions
+    recent_df = pd.DataFrame(transactions_data['transactions'])  # Newest 10 transactions
     st.dataframe(
         recent_df[['date', 'description', 'amount', 'category']], 
         width='stretch',
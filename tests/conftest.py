@@ -0,0 +1,35 @@
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from config import DATABASE_URL
+from db.models import Base
+
+@pytest.fixture
+def scratch_engine():
+    """Engine bound to a throwaway Postgres schema holding an empty copy of the app's tables."""
+    schema = f"test_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(DATABASE_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    # The statement timeout turns a lock wait into a failure instead of a hung test run
+    engine = create_engine(DATABASE_URL, connect_args={"options": f"-c search_path={schema} -c statement_timeout=10000"})
+    Base.metadata.create_all(bind=engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+@pytest.fixture
+def scratch_db(scratch_engine):
+    session = sessionmaker(bind=scratch_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
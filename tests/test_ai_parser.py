@@ -0,0 +1,45 @@
+import services.ai_parser as ai_parser
+from services.ai_parser import PAGE_SEPARATOR, merge_chunk_results, parse_with_ai, split_statement_text
+
+def _statement(pages, rows_per_page):
+    return PAGE_SEPARATOR.join(
+        "\n".join(f"2024-01-{row + 1:02d} Merchant {page}-{row} $-{row + 1}.00" for row in range(rows_per_page))
+        for page in range(pages)
+    )
+
+def test_split_statement_text_keeps_every_line():
+    text = _statement(pages=3, rows_per_page=40)
+    chunks = split_statement_text(text, max_tokens=150, overlap_lines=2)
+    assert len(chunks) > 3
+    seen = {line for chunk in chunks for line in chunk.splitlines()}
+    assert seen == set(text.replace(PAGE_SEPARATOR, "\n").splitlines())
+
+def test_split_statement_text_single_chunk_when_within_budget():
+    text = _statement(pages=1, rows_per_page=3)
+    assert split_statement_text(text, max_tokens=1000) == [text]
+
+def test_merge_chunk_results_drops_boundary_duplicates_only():
+    a = {"date": "2024-01-01", "description": "Coffee", "amount": -3.0}
+    b = {"date": "2024-01-02", "description": "Rent", "amount": -900.0}
+    c = {"date": "2024-01-03", "description": "Coffee", "amount": -3.0}
+    merged = merge_chunk_results([[a, a, b], [b, c]], overlap_lines=2)
+    assert merged == [a, a, b, c]
+
+def test_failed_chunk_marks_extraction_incomplete(monkeypatch):
+    def fake_completion(messages, deployment=None, use_cache=True, validate=None, **params):
+        if "Merchant 1-" in messages[-1]["content"]:
+            return "Sorry, I cannot help with that."
+        return '[{"date": "2024-01-01", "description": "Merchant 0-0", "amount": -1.0}]'
+
+    monkeypatch.setattr(ai_parser, "chat_completion", fake_completion)
+    text = _statement(pages=2, rows_per_page=40)
+    monkeypatch.setattr(ai_parser, "split_statement_text", lambda text: text.split(PAGE_SEPARATOR))
+
+    transactions, complete = parse_with_ai(text)
+    assert not complete
+    assert [tx["description"] for tx in transactions] == ["Merchant 0-0"]
+
+    monkeypatch.setattr(ai_parser, "chat_completion", lambda *args, **kwargs: "[not json")
+    transactions, complete = parse_with_ai(text)
+    assert not complete
+    assert [tx["description"] for tx in transactions] == [ai_parser.AI_FALLBACK_DESCRIPTION]
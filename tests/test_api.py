@@ -2,14 +2,18 @@ import pytest
 from fastapi.testclient import TestClient
 from main import app
 
-client = TestClient(app)
+@pytest.fixture(scope="module")
+def client():
+    # One client (and event loop) for the module: pooled asyncpg connections are bound to their loop
+    with TestClient(app) as test_client:
+        yield test_client
 
-def test_root():
+def test_root(client):
     response = client.get("/")
     assert response.status_code == 200
     assert "Finance Assistant API" in response.json()["message"]
 
-def test_insights_summary_empty():
+def test_insights_summary_empty(client):
     response = client.get("/insights/summary")
     assert response.status_code == 200
     data = response.json()
@@ -17,3 +21,109 @@ def test_insights_summary_empty():
     assert "total_expenses" in data
     assert "balance" in data
     assert "transactions" in data
+
+def test_job_status_not_found(client):
+    response = client.get("/jobs/does-not-exist")
+    assert response.status_code == 404
+
+def test_upload_cache_evict_missing_entry(client):
+    response = client.delete("/uploads/cache/" + "0" * 64)
+    assert response.status_code == 404
+
+def test_upload_cache_list(client):
+    response = client.get("/uploads/cache")
+    assert response.status_code == 200
+    assert "entries" in response.json()
+
+def test_transactions_pages_follow_cursor_without_overlap(client):
+    first = client.get("/transactions", params={"limit": 2, "sort": "date_asc"})
+    assert first.status_code == 200
+    page = first.json()
+    assert page["count"] == len(page["transactions"]) <= 2
+    if page["next_cursor"]:
+        second = client.get("/transactions", params={"limit": 2, "sort": "date_asc", "cursor": page["next_cursor"]}).json()
+        seen = [(tx["date"], tx["id"]) for tx in page["transactions"] + second["transactions"]]
+        assert seen == sorted(set(seen))
+
+def test_transactions_rejects_bad_cursor_and_sort(client):
+    assert client.get("/transactions", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/transactions", params={"sort": "random"}).status_code == 400
+    assert client.get("/transactions", params={"sign": "both"}).status_code == 400
+
+def test_export_csv_streams_text_csv(client):
+    response = client.get("/export/csv")
+    assert response.status_code in (200, 404)
+    if response.status_code == 200:
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.text.splitlines()[0] == "date,description,amount,category"
+
+def test_insights_summary_date_bounded(client):
+    response = client.get("/insights/summary", params={"start_date": "2024-01-01", "end_date": "2024-01-31"})
+    assert response.status_code == 200
+    assert set(response.json()) == {"total_income", "total_expenses", "balance", "transactions"}
+
+def test_duplicates_list(client):
+    response = client.get("/duplicates", params={"limit": 5})
+    assert response.status_code == 200
+    assert response.json()["count"] == len(response.json()["pairs"]) <= 5
+
+def test_spool_upload_writes_whole_file():
+    import asyncio, io, os
+    from starlette.datastructures import UploadFile
+    from api import routes
+
+    content = b"date,description,amount\n" + b"2024-01-02,Coffee,-3.5\n" * 50_000
+    path = asyncio.run(routes._spool_upload(UploadFile(io.BytesIO(content), filename="big.csv"), ".csv"))
+    try:
+        with open(path, "rb") as spooled:
+            assert spooled.read() == content
+    finally:
+        os.remove(path)
+
+def test_startup_fails_when_migrations_fail(monkeypatch):
+    import main
+
+    async def database_up():
+        pass
+
+    def failing_migration():
+        raise RuntimeError("migration 2 failed")
+
+    monkeypatch.delenv("TESTING", raising=False)
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", True)
+    monkeypatch.setattr(main, "wait_for_database", database_up)
+    monkeypatch.setattr(main, "_migrate", failing_migration)
+    with pytest.raises(RuntimeError, match="migration 2 failed"):
+        with TestClient(main.app):
+            pass
+
+def test_insights_cache_follows_reader_data_version(monkeypatch):
+    import asyncio
+    import api.routes as routes
+
+    reader = {"version": 4}
+    computed = []
+
+    async def fake_version(db):
+        return reader["version"], 0
+
+    async def compute(db):
+        computed.append(reader["version"])
+        return {"version": reader["version"]}
+
+    monkeypatch.setattr(routes, "aread_data_version", fake_version)
+    monkeypatch.setattr(routes, "_insights_cache", {})
+    monkeypatch.setattr(routes, "_written_version", 5)  # our last write, not on the replica yet
+
+    assert asyncio.run(routes._get_cached_or_compute("summary", compute, None)) == {"version": 4}
+    asyncio.run(routes._get_cached_or_compute("summary", compute, None))
+    assert computed == [4, 4]  # the lagging result was not cached
+
+    reader["version"] = 5
+    asyncio.run(routes._get_cached_or_compute("summary", compute, None))
+    assert asyncio.run(routes._get_cached_or_compute("summary", compute, None)) == {"version": 5}
+    assert computed == [4, 4, 5]
+
+    reader["version"] = 6  # a write by another process reached the replica
+    asyncio.run(routes._get_cached_or_compute("summary", compute, None))
+    assert computed == [4, 4, 5, 6]
@@ -0,0 +1,28 @@
+import json
+
+import services.categorizer as categorizer
+
+def test_batch_categorize_dedupes_and_maps_back_by_index(monkeypatch):
+    requests = []
+
+    def fake_completion(messages, deployment=None, use_cache=True, **params):
+        prompt = messages[-1]["content"]
+        items = [json.loads(line) for line in prompt.split("one JSON object per line):\n")[1].strip().splitlines()]
+        requests.append(items)
+        answers = {"Grocery Store": "Food", "Salary Deposit": "Salary", "Mystery": "Not A Category"}
+        return json.dumps({"results": [{"id": item["id"], "category": answers[item["description"]]} for item in items]})
+
+    monkeypatch.setattr(categorizer, "chat_completion", fake_completion)
+    monkeypatch.setattr(categorizer, "CATEGORIZE_BATCH_SIZE", 2)
+
+    transactions = [
+        {"description": "Grocery Store", "amount": -10.0},
+        {"description": "grocery  store", "amount": -25.0},
+        {"description": "Salary Deposit", "amount": 2000.0},
+        {"description": "Mystery", "amount": -1.0},
+    ]
+    categorized = categorizer.batch_categorize_transactions(transactions)
+
+    assert [tx["category"] for tx in categorized] == ["Food", "Food", "Salary", "Other"]
+    assert sum(len(items) for items in requests) == 3
+    assert len(requests) == 2
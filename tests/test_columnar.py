@@ -0,0 +1,33 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow.parquet as pq
+
+import services.columnar as columnar
+
+ROWS = [(date(2024, 1, day), f"Merchant {day}", -float(day), None if day % 2 else "Food") for day in range(1, 8)]
+
+def test_write_parquet_groups_cursor_batches_into_row_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "iter_transaction_batches", lambda db: iter([ROWS[:3], ROWS[3:6], ROWS[6:]]))
+    monkeypatch.setattr(columnar, "PARQUET_ROW_GROUP_ROWS", 6)
+
+    path = str(tmp_path / "export.parquet")
+    assert columnar.write_parquet(None, path) == 7
+
+    parquet_file = pq.ParquetFile(path)
+    assert [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)] == [6, 1]
+    assert parquet_file.read().to_pylist()[1] == {"date": date(2024, 1, 2), "description": "Merchant 2", "amount": -2.0, "category": "Food"}
+
+def test_parquet_chunks_round_trip_into_normalized_frames(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "iter_transaction_batches", lambda db: iter([ROWS]))
+    path = str(tmp_path / "export.parquet")
+    columnar.write_parquet(None, path)
+
+    frames = list(columnar.iter_parquet_chunks(path, chunksize=4))
+    assert [len(frame) for frame in frames] == [4, 3]
+    assert str(frames[0]["date"].dtype).startswith("datetime64")
+    assert frames[0]["amount"].tolist() == [-1.0, -2.0, -3.0, -4.0]
+    assert frames[0]["category"].isna().tolist() == [True, False, True, False]
@@ -0,0 +1,33 @@
+from sqlalchemy import text
+
+import db.crud as crud
+from db.crud import bulk_insert_transactions
+
+def _tx(day, description, amount):
+    return {"date": f"2024-04-{day:02d}", "description": description, "amount": amount, "category": "Food"}
+
+def test_bulk_insert_skips_in_batch_and_stored_duplicates(scratch_db):
+    first = bulk_insert_transactions(scratch_db, [_tx(1, "Bakery", -3.0)])
+    assert (first["inserted"], first["skipped"], len(first["ids"])) == (1, 0, 1)
+
+    result = bulk_insert_transactions(scratch_db, [
+        _tx(1, "bakery", -3.0),          # already stored (case differs)
+        _tx(2, "Market", -20.0),
+        _tx(2, "Market", -20.0),         # repeated within the batch
+        _tx(3, "Cafe", -4.0),
+        _tx(4, "Grocer", -15.0),
+        _tx(5, "Deli", -8.0),
+    ], batch_size=2)                     # several multi-row INSERT pages
+    assert (result["inserted"], result["skipped"]) == (4, 2)
+    stored = scratch_db.execute(text("SELECT id, description FROM transactions ORDER BY id")).all()
+    assert [row.description for row in stored] == ["Bakery", "Market", "Cafe", "Grocer", "Deli"]
+    assert sorted(result["ids"]) == [row.id for row in stored[1:]]
+
+def test_bulk_insert_counts_rows_skipped_by_the_constraint(scratch_db, monkeypatch):
+    bulk_insert_transactions(scratch_db, [_tx(1, "Bakery", -3.0)])
+    # As if a concurrent writer stored the row after the fingerprint lookup: ON CONFLICT skips it
+    monkeypatch.setattr(crud, "dedupe_batch", lambda db, rows: rows)
+
+    result = bulk_insert_transactions(scratch_db, [_tx(1, "Bakery", -3.0), _tx(2, "Market", -20.0)])
+    assert (result["inserted"], result["skipped"], len(result["ids"])) == (1, 1, 1)
+    assert scratch_db.execute(text("SELECT count(*) FROM transactions")).scalar() == 2
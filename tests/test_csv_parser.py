@@ -0,0 +1,44 @@
+from services.csv_parser import detect_date_format, iter_csv_chunks, parse_csv
+
+CSV_CONTENT = b"""date,description,amount,category
+2024-01-02,Grocery Store,-42.10,Food
+2024-01-03,Salary Deposit,2000,
+not-a-date,Broken Row,-1.00,Other
+2024-01-05,Gas Station,abc,Transportation
+"""
+
+def test_parse_csv_vectorized_values():
+    transactions = parse_csv(CSV_CONTENT)
+    assert transactions == [
+        {"date": "2024-01-02", "description": "Grocery Store", "amount": -42.10, "category": "Food"},
+        {"date": "2024-01-03", "description": "Salary Deposit", "amount": 2000.0, "category": None},
+    ]
+
+def test_iter_csv_chunks_respects_chunksize():
+    chunks = list(iter_csv_chunks(CSV_CONTENT, chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 0]
+    assert list(chunks[0].columns) == ["date", "description", "amount", "category"]
+
+def test_mixed_date_formats_parse_the_same_in_every_chunk():
+    content = b"date,description,amount\n01/15/2024,Book,-10\n2024-01-16,Pen,-2\n"
+    for chunksize in (1, 2):
+        frames = list(iter_csv_chunks(content, chunksize=chunksize))
+        assert [str(date.date()) for frame in frames for date in frame["date"]] == ["2024-01-15", "2024-01-16"]
+
+def test_dropped_rows_are_counted():
+    (frame,) = list(iter_csv_chunks(CSV_CONTENT))
+    assert len(frame) == 2
+    assert (frame.attrs["invalid_dates"], frame.attrs["invalid_amounts"]) == (1, 1)
+
+def test_auto_date_format_is_detected_once_per_file():
+    # 13/01 can only be day first, so 02/01 is 2 January in every chunk
+    content = b"date,description,amount\n13/01/2024,Book,-10\n02/01/2024,Pen,-2\n"
+    for chunksize in (1, 2):
+        frames = list(iter_csv_chunks(content, chunksize=chunksize))
+        assert [str(date.date()) for frame in frames for date in frame["date"]] == ["2024-01-13", "2024-01-02"]
+
+def test_detect_date_format_ignores_values_that_are_not_dates():
+    import pandas as pd
+    assert detect_date_format(pd.Series(["01/31/2024", "not-a-date", None, "02/01/2024"])) == "%m/%d/%Y"
+    assert detect_date_format(pd.Series(["2024-01-31", "2024-02-01"])) == "ISO8601"
+    assert detect_date_format(pd.Series([None, "n/a"])) is None
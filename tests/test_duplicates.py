@@ -0,0 +1,33 @@
+from datetime import date
+
+from services.duplicates import _to_row, find_near_duplicates
+
+def _rows(*rows):
+    return sorted((_to_row(*row) for row in rows), key=lambda row: (row.amount, row.date, row.id))
+
+def test_flags_reformatted_rows_within_window_and_same_amount():
+    pairs = find_near_duplicates(_rows(
+        (1, date(2024, 3, 4), -5.75, "STARBUCKS #1234 SEATTLE WA"),
+        (2, date(2024, 3, 5), -5.75, "Starbucks Seattle"),
+        (3, date(2024, 3, 5), -5.70, "Starbucks Seattle"),     # different amount
+        (4, date(2024, 3, 20), -5.75, "Starbucks Seattle WA"),  # outside the date window
+        (5, date(2024, 3, 6), -5.75, "Shell Oil"),              # unrelated description
+    ), window_days=3, min_similarity=0.5)
+    assert [(newer, older) for newer, older, _ in pairs] == [(2, 1)]
+
+def test_identical_text_on_another_day_is_a_repeat_not_a_duplicate():
+    rows = _rows((1, date(2024, 3, 4), -3.5, "Coffee Shop"), (2, date(2024, 3, 5), -3.5, "Coffee Shop"))
+    assert find_near_duplicates(rows, window_days=3, min_similarity=0.5) == []
+
+def test_identical_text_on_the_same_day_is_compared():
+    rows = _rows((1, date(2024, 3, 4), -3.5, "Coffee Shop"), (2, date(2024, 3, 4), -3.5, "coffee  shop"))
+    assert find_near_duplicates(rows, window_days=3, min_similarity=0.5) == [(2, 1, 1.0)]
+
+def test_keep_restricts_compared_pairs():
+    rows = _rows(
+        (1, date(2024, 3, 4), -9.99, "Netflix.com"),
+        (2, date(2024, 3, 4), -9.99, "NETFLIX COM"),
+        (3, date(2024, 3, 5), -9.99, "Netflix Com CA"),
+    )
+    pairs = find_near_duplicates(rows, keep=lambda row, other: 3 in (row.id, other.id), window_days=3, min_similarity=0.5)
+    assert sorted((newer, older) for newer, older, _ in pairs) == [(3, 1), (3, 2)]
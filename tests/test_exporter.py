@@ -0,0 +1,19 @@
+from datetime import date
+
+from openpyxl import load_workbook
+
+import services.exporter as exporter
+
+def test_write_excel_splits_sheets_past_row_limit(tmp_path, monkeypatch):
+    rows = [(date(2024, 1, day), f"Merchant {day}", -float(day), "Food") for day in range(1, 6)]
+    monkeypatch.setattr(exporter, "iter_transaction_batches", lambda db: iter([rows[:3], rows[3:]]))
+
+    path = tmp_path / "export.xlsx"
+    assert exporter.write_excel(None, str(path), max_rows_per_sheet=2) == 5
+
+    workbook = load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ["Transactions", "Transactions 2", "Transactions 3"]
+    sheets = [list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets]
+    assert all(sheet[0] == tuple(exporter.EXPORT_COLUMNS) for sheet in sheets)
+    assert [len(sheet) - 1 for sheet in sheets] == [2, 2, 1]
+    assert sheets[2][1][1] == "Merchant 5"
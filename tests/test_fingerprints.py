@@ -0,0 +1,79 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+import db.fingerprints as fingerprints
+from db.fingerprints import transaction_fingerprint
+from services.duplicates import scan_near_duplicates
+
+def test_fingerprint_ignores_case_and_spacing_only():
+    base = transaction_fingerprint(date(2024, 1, 5), "Coffee  Shop #12", -4.5)
+    assert transaction_fingerprint(date(2024, 1, 5), " coffee shop #12", -4.50) == base
+    assert transaction_fingerprint(date(2024, 1, 5), "Coffee Shop #13", -4.5) != base
+    assert transaction_fingerprint(date(2024, 1, 6), "Coffee Shop #12", -4.5) != base
+    assert -2**63 <= base < 2**63
+
+def test_new_fingerprint_mask_drops_stored_and_repeated_rows(monkeypatch):
+    windows = []
+    def fake_existing(db, fps, start, end):
+        windows.append((start, end))
+        return {2}
+    monkeypatch.setattr(fingerprints, "existing_fingerprints", fake_existing)
+
+    dates = [date(2024, 1, 3), date(2024, 1, 1), date(2024, 1, 3), date(2024, 1, 9)]
+    assert fingerprints.new_fingerprint_mask(None, dates, [1, 2, 1, 3]) == [True, False, False, True]
+    assert windows == [(date(2024, 1, 1), date(2024, 1, 9))]
+
+def _old_schema_with_collision(db):
+    db.execute(text(f"ALTER TABLE transactions DROP CONSTRAINT {fingerprints.FINGERPRINT_CONSTRAINT}"))
+    db.execute(text("ALTER TABLE transactions ADD CONSTRAINT unique_transaction UNIQUE (date, description, amount)"))
+    db.execute(text(
+        "INSERT INTO transactions (date, description, amount) VALUES "
+        "('2024-01-05', 'Coffee Shop', -4.5), ('2024-01-05', 'COFFEE  shop', -4.5), ('2024-01-06', 'Coffee Shop', -4.5)"
+    ))
+    db.commit()
+
+def test_ensure_fingerprints_flags_collisions_instead_of_deleting(scratch_db):
+    _old_schema_with_collision(scratch_db)
+
+    with pytest.raises(fingerprints.FingerprintCollisionError):
+        fingerprints.ensure_fingerprints(scratch_db)
+
+    assert scratch_db.execute(text("SELECT count(*) FROM transactions")).scalar() == 3
+    ids = scratch_db.execute(text("SELECT id FROM transactions ORDER BY id")).scalars().all()
+    assert scratch_db.execute(text("SELECT transaction_id, duplicate_of_id, kind FROM duplicate_candidates")).all() == [(ids[1], ids[0], "fingerprint")]
+
+    # A near-duplicate rescan replaces its own candidates only
+    assert scan_near_duplicates(scratch_db)["scanned"] == 3
+    assert scratch_db.execute(text("SELECT kind, count(*) FROM duplicate_candidates GROUP BY kind")).all() == [("fingerprint", 1)]
+    assert not fingerprints._constraint_exists(scratch_db, fingerprints.FINGERPRINT_CONSTRAINT)
+    assert fingerprints._constraint_exists(scratch_db, "unique_transaction")
+
+    assert fingerprints.delete_fingerprint_duplicates(scratch_db) == 1
+    assert scratch_db.execute(text("SELECT id FROM transactions ORDER BY id")).scalars().all() == [ids[0], ids[2]]
+    assert fingerprints._constraint_exists(scratch_db, fingerprints.FINGERPRINT_CONSTRAINT)
+    assert scratch_db.execute(text("SELECT count(*) FROM duplicate_candidates")).scalar() == 0
+    fingerprints.ensure_fingerprints(scratch_db)
+
+def test_ensure_candidate_kinds_labels_existing_collision_flags(scratch_db):
+    # An older database: no kind column, and colliding rows kept out of the fingerprint constraint
+    scratch_db.execute(text("ALTER TABLE duplicate_candidates DROP COLUMN kind"))
+    scratch_db.execute(text(f"ALTER TABLE transactions DROP CONSTRAINT {fingerprints.FINGERPRINT_CONSTRAINT}"))
+    rows = [("2024-01-05", "Coffee Shop"), ("2024-01-05", "coffee shop"), ("2024-01-05", "Coffee Shop #2")]
+    ids = []
+    for day, description in rows:
+        ids.append(scratch_db.execute(
+            text("INSERT INTO transactions (date, description, amount, fingerprint) VALUES (:day, :description, -4.5, :fp) RETURNING id"),
+            {"day": day, "description": description, "fp": transaction_fingerprint(date(2024, 1, 5), description, -4.5)},
+        ).scalar())
+    scratch_db.execute(text(
+        "INSERT INTO duplicate_candidates (transaction_id, duplicate_of_id, similarity) VALUES (:a, :b, 1.0), (:c, :b, 0.8)"
+    ), {"a": ids[1], "b": ids[0], "c": ids[2]})
+    scratch_db.commit()
+
+    fingerprints.ensure_candidate_kinds(scratch_db)
+    fingerprints.ensure_candidate_kinds(scratch_db)
+    assert scratch_db.execute(text("SELECT transaction_id, kind FROM duplicate_candidates ORDER BY transaction_id")).all() == [
+        (ids[1], "fingerprint"), (ids[2], "near"),
+    ]
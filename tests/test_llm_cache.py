@@ -0,0 +1,37 @@
+from services.llm_cache import LLMResponseCache
+
+def test_llm_cache_evicts_least_recently_used(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=3600, max_bytes=30)
+    cache.set("a", "x" * 10)
+    cache.set("b", "x" * 10)
+    cache.set("c", "x" * 10)
+    assert cache.get("a") == "x" * 10  # "a" becomes most recently used
+    cache.set("d", "x" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["entries"] == 3
+
+def test_llm_cache_expires_entries(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=-1, max_bytes=1000)
+    cache.set("a", "value")
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+def test_llm_cache_key_depends_on_parameters():
+    messages = [{"role": "user", "content": "Categorize: Grocery Store"}]
+    assert LLMResponseCache.make_key("gpt-4", messages, {"temperature": 0.1}) != \
+        LLMResponseCache.make_key("gpt-4", messages, {"temperature": 0.2})
+
+def test_llm_cache_tracks_total_size_across_connections(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = LLMResponseCache(path, ttl_seconds=3600, max_bytes=25)
+    second = LLMResponseCache(path, ttl_seconds=3600, max_bytes=25)
+    first.set("a", "x" * 10)
+    first.set("a", "x" * 5)  # overwrite: the size changes, not adds up
+    second.set("b", "x" * 10)
+    assert first.stats()["size_bytes"] == 15
+    first.set("c", "x" * 10)  # 25 bytes, still within the limit
+    second.set("d", "x" * 10)  # 35 bytes: the least recently used "a" and "b" go
+    assert first.get("a") is None and first.get("b") is None
+    assert second.stats()["size_bytes"] == 20
+    assert second.stats()["entries"] == 2
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+import services.llm_gateway as llm_gateway
+from services.llm_cache import LLMResponseCache
+from services.llm_gateway import AdaptiveConcurrencyLimiter, LLMGateway, TokenBucket, register_backend
+
+def test_token_bucket_waits_once_capacity_is_spent():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket._reserve(60) == 0
+    assert bucket._reserve(2) == pytest.approx(2, abs=0.1)
+
+def test_token_bucket_refunds_cancelled_async_wait():
+    bucket = TokenBucket(rate_per_minute=60)
+    bucket._reserve(60)
+
+    async def cancelled_acquire():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(bucket.acquire_async(30), timeout=0.05)
+
+    asyncio.run(cancelled_acquire())
+    # Only the time spent waiting has refilled the bucket, the 30 tokens were given back
+    assert bucket._reserve(0) == 0
+    assert bucket._reserve(2) == pytest.approx(2, abs=0.2)
+
+def test_limiter_halves_on_rate_limit_and_grows_back():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, minimum=1, maximum=16)
+    limiter.acquire()
+    limiter.release(rate_limited=True)
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 5
+
+def test_async_acquire_waits_for_release_from_another_thread():
+    limiter = AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1)
+    limiter.acquire()
+
+    async def acquire():
+        waiting = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        threading.Timer(0.05, limiter.release).start()
+        await asyncio.wait_for(waiting, timeout=2)
+
+    asyncio.run(acquire())
+    assert limiter.in_flight == 1
+    assert limiter._async_waiters == []
+
+class _FakeCompletions:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def create(self, model, messages, **params):
+        self.calls += 1
+        if self.calls <= self.failures:
+            response = httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "http://stub"))
+            raise RateLimitError("rate limited", response=response, body=None)
+        message = SimpleNamespace(content=f"{model}:{messages[-1]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def test_gateway_retries_rate_limited_requests_on_one_client(monkeypatch):
+    completions = _FakeCompletions(failures=2)
+    created = []
+
+    def client_factory():
+        created.append(1)
+        return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    register_backend("fake", lambda: (client_factory, client_factory))
+    monkeypatch.setattr(llm_gateway, "LLM_CACHE_BYPASS", True)
+    gateway = LLMGateway("fake")
+
+    assert gateway.chat_completion([{"role": "user", "content": "hi"}], "stub") == "stub:hi"
+    assert gateway.chat_completion([{"role": "user", "content": "again"}], "stub") == "stub:again"
+    assert completions.calls == 4
+    assert len(created) == 1
+    assert gateway.stats()["rate_limited"] == 2
+
+def test_gateway_caches_only_validated_replies(monkeypatch, tmp_path):
+    completions = _FakeCompletions(failures=0)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    register_backend("fake", lambda: (lambda: client, lambda: client))
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=3600, max_bytes=1000)
+    monkeypatch.setattr(llm_gateway, "LLM_CACHE_BYPASS", False)
+    monkeypatch.setattr(llm_gateway, "get_llm_cache", lambda: cache)
+    gateway = LLMGateway("fake")
+    messages = [{"role": "user", "content": "hi"}]
+
+    assert gateway.chat_completion(messages, "stub", validate=lambda reply: False) == "stub:hi"
+    assert gateway.chat_completion(messages, "stub", validate=lambda reply: False) == "stub:hi"
+    assert completions.calls == 2
+    assert cache.stats()["entries"] == 0
+
+    assert gateway.chat_completion(messages, "stub", validate=lambda reply: reply == "stub:hi") == "stub:hi"
+    assert gateway.chat_completion(messages, "stub") == "stub:hi"
+    assert completions.calls == 3
+
+def test_gateway_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        LLMGateway("nope")
@@ -0,0 +1,20 @@
+from services.merchant_rules import MerchantRuleIndex, normalize_description
+
+def test_normalize_description_strips_store_numbers():
+    assert normalize_description("STARBUCKS #1234 Seattle, WA") == "starbucks seattle wa"
+
+def test_rule_index_prefers_exact_then_longest_keyword():
+    index = MerchantRuleIndex(
+        exact={"krabby patty magazine subscription": "Subscriptions"},
+        keywords={"krabby patty": "Food", "gas": "Utilities", "gas station": "Transportation"},
+    )
+    assert index.lookup("Krabby Patty Magazine Subscription") == "Subscriptions"
+    assert index.lookup("Krabby Patty #12") == "Food"
+    assert index.lookup("Shell Gas Station 0042") == "Transportation"
+    assert index.lookup("Unknown Merchant") is None
+
+def test_rule_index_add_exact_invalidates_memoized_misses():
+    index = MerchantRuleIndex(exact={}, keywords={})
+    assert index.lookup("Zorg Corp") is None
+    index.add_exact("zorg corp", "Shopping")
+    assert index.lookup("Zorg Corp") == "Shopping"
@@ -0,0 +1,39 @@
+from datetime import date
+
+from sqlalchemy import text
+
+from db.partitioning import _create_partition_sql, _next_month, partition_name
+
+def test_partition_bounds_wrap_at_year_end():
+    assert _next_month(date(2024, 12, 1)) == date(2025, 1, 1)
+    assert partition_name(date(2024, 3, 1)) == "transactions_p2024_03"
+    assert _create_partition_sql(date(2024, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS transactions_p2024_12 PARTITION OF transactions "
+        "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')"
+    )
+
+def test_bulk_insert_creates_missing_partition_without_waiting_on_itself(scratch_db, monkeypatch):
+    import db.partitioning as partitioning
+    from db.crud import bulk_insert_transactions, bulk_insert_frame
+    import pandas as pd
+
+    monkeypatch.setattr(partitioning, "_known_months", None)
+    monkeypatch.setattr(partitioning, "_partitioned", False)
+    scratch_db.execute(text("INSERT INTO transactions (date, description, amount, fingerprint) VALUES ('2024-01-15', 'seed', -1, 1)"))
+    scratch_db.commit()
+    partitioning.migrate_to_partitioned(scratch_db, months_ahead=0)
+
+    # May 2031 has no partition: it is created while the ingest session is open
+    result = bulk_insert_transactions(scratch_db, [
+        {"date": "2031-05-02", "description": "Rent", "amount": -900.0},
+        {"date": "2031-05-02", "description": "Rent", "amount": -900.0},
+    ])
+    assert (result["inserted"], result["skipped"]) == (1, 1)
+
+    frame = pd.DataFrame({"date": pd.to_datetime(["2031-07-03"]), "description": ["Gym"], "amount": [-30.0], "category": [None]})
+    assert bulk_insert_frame(scratch_db, frame)["inserted"] == 1
+
+    assert scratch_db.execute(text(
+        "SELECT count(*) FROM pg_inherits WHERE inhparent = 'transactions'::regclass "
+        "AND inhrelid::regclass::text IN ('transactions_p2031_05', 'transactions_p2031_07')"
+    )).scalar() == 2
@@ -0,0 +1,53 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import services.pdf_parser as pdf_parser
+
+def _pdf(pages: int) -> bytes:
+    canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+    buffer = io.BytesIO()
+    document = canvas.Canvas(buffer)
+    for number in range(1, pages + 1):
+        document.drawString(72, 720, f"Statement page {number}")
+        document.showPage()
+    document.save()
+    return buffer.getvalue()
+
+@pytest.fixture
+def sharded(monkeypatch):
+    monkeypatch.setattr(pdf_parser, "PDF_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(pdf_parser, "PDF_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(pdf_parser, "PDF_EXTRACT_WORKERS", 2)
+    monkeypatch.setattr(pdf_parser, "_extract_pool", None)
+    yield
+    pdf_parser.shutdown_extract_pool()
+
+def test_process_pool_pages_come_back_in_order(sharded):
+    pages = list(pdf_parser.iter_pdf_page_extracts(_pdf(5), parse_tables=False))
+    assert [page["page"] for page in pages] == [1, 2, 3, 4, 5]
+    assert [page["text"] for page in pages] == [f"Statement page {number}" for number in range(1, 6)]
+
+def test_failing_worker_is_reported_with_its_pages(sharded, monkeypatch):
+    sources = []
+    extract = pdf_parser._extract_page_range
+
+    def flaky(source, start, stop, parse_tables):
+        sources.append(source)
+        if start == 2:
+            raise RuntimeError("worker crashed")
+        return extract(source, start, stop, parse_tables)
+
+    monkeypatch.setattr(pdf_parser, "_get_extract_pool", lambda: ThreadPoolExecutor(max_workers=2))
+    monkeypatch.setattr(pdf_parser, "_extract_page_range", flaky)
+
+    pages = pdf_parser.iter_pdf_page_extracts(_pdf(5), parse_tables=False)
+    assert [next(pages)["page"], next(pages)["page"]] == [1, 2]
+    with pytest.raises(pdf_parser.PdfExtractionError, match="pages 3-4") as error:
+        next(pages)
+    assert isinstance(error.value.__cause__, RuntimeError)
+    # Workers got the spooled file's path, which is removed once extraction ends
+    assert all(isinstance(source, str) for source in sources)
+    assert not any(os.path.exists(source) for source in sources)
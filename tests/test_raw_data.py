@@ -0,0 +1,9 @@
+import db.raw_data as raw_data
+
+def test_raw_data_keeps_only_fields_without_columns(monkeypatch):
+    tx = {"date": "2024-01-05", "description": "Coffee", "amount": -4.5, "category": "Food", "balance": 120.5}
+    assert raw_data.raw_data_for(tx) == {"balance": 120.5}
+    assert raw_data.raw_data_for({key: tx[key] for key in raw_data.COLUMN_FIELDS}) is None
+
+    monkeypatch.setattr(raw_data, "RAW_DATA_MODE", "full")
+    assert raw_data.raw_data_for(tx) == tx
@@ -0,0 +1,28 @@
+from sqlalchemy import text
+
+from db.crud import bulk_insert_transactions, insert_transaction
+from db.rollups import rebuild_rollups
+
+_ROLLUPS = "SELECT month, category, sign, round(total::numeric, 2), count, min_amount, max_amount FROM transaction_rollups ORDER BY 1, 2, 3"
+
+def test_incremental_rollups_match_a_full_rebuild(scratch_db):
+    bulk_insert_transactions(scratch_db, [
+        {"date": "2024-01-03", "description": "Salary", "amount": 2500.0, "category": "Income"},
+        {"date": "2024-01-05", "description": "Groceries", "amount": -80.25, "category": "Food"},
+        {"date": "2024-01-20", "description": "Refund", "amount": 0.0},
+        {"date": "2024-02-01", "description": "Rent", "amount": -900.0, "category": "Housing"},
+    ])
+    # Second batch: duplicates of stored and of in-batch rows, an existing group and a new category
+    bulk_insert_transactions(scratch_db, [
+        {"date": "2024-01-05", "description": "GROCERIES", "amount": -80.25, "category": "Food"},
+        {"date": "2024-01-09", "description": "Bakery", "amount": -4.5, "category": "Food"},
+        {"date": "2024-01-09", "description": "Bakery", "amount": -4.5, "category": "Food"},
+        {"date": "2024-02-14", "description": "Flowers", "amount": -30.0, "category": None},
+        {"date": "2024-02-15", "description": "Bonus", "amount": 500.0, "category": "Income"},
+    ])
+    insert_transaction(scratch_db, {"date": "2024-02-16", "description": "Cinema", "amount": -12.0, "category": "Entertainment"})
+
+    incremental = scratch_db.execute(text(_ROLLUPS)).all()
+    assert sum(row.count for row in incremental) == 8
+    rebuild_rollups(scratch_db)
+    assert scratch_db.execute(text(_ROLLUPS)).all() == incremental
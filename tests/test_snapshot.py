@@ -0,0 +1,33 @@
+from sqlalchemy import text
+
+from db.crud import bulk_insert_transactions
+from db.data_version import bump_data_version
+from services.snapshot import TransactionSnapshot
+
+def _insert(db, *days):
+    bulk_insert_transactions(db, [{"date": f"2024-03-{day:02d}", "description": f"Shop {day}", "amount": -float(day)} for day in days])
+
+def test_snapshot_appends_new_rows_and_skips_unchanged_versions(scratch_db):
+    snapshot = TransactionSnapshot()
+    _insert(scratch_db, 1, 2)
+    first = snapshot.refresh(scratch_db)
+    assert first["amount"].tolist() == [-1.0, -2.0]
+    assert snapshot.refresh(scratch_db) is first
+
+    _insert(scratch_db, 3)
+    scratch_db.execute(text("UPDATE transactions SET amount = -100 WHERE description = 'Shop 1'"))
+    scratch_db.commit()
+    # Only rows past max_id are fetched: the unannounced edit is not picked up
+    assert snapshot.refresh(scratch_db)["amount"].tolist() == [-1.0, -2.0, -3.0]
+    assert snapshot.max_id == scratch_db.execute(text("SELECT max(id) FROM transactions")).scalar()
+
+def test_snapshot_reloads_after_reset_version(scratch_db):
+    snapshot = TransactionSnapshot()
+    _insert(scratch_db, 1, 2, 3)
+    assert len(snapshot.refresh(scratch_db)) == 3
+
+    scratch_db.execute(text("DELETE FROM transactions WHERE description = 'Shop 2'"))
+    bump_data_version(scratch_db, reset=True)
+    scratch_db.commit()
+    assert snapshot.refresh(scratch_db)["description"].tolist() == ["Shop 1", "Shop 3"]
+    assert (snapshot.version, snapshot.reset_version) == (2, 2)
@@ -0,0 +1,55 @@
+from services.table_extractor import parse_statement_amount, parse_statement_date, _parse_rows, _find_header
+
+def test_parse_statement_amount_formats():
+    assert parse_statement_amount("$-10.00") == -10.0
+    assert parse_statement_amount("-$1,234.56") == -1234.56
+    assert parse_statement_amount("(45.00)") == -45.0
+    assert parse_statement_amount("12.00 CR") == 12.0
+    assert parse_statement_amount("Grocery") is None
+
+def test_parse_statement_date_formats():
+    assert parse_statement_date("2024-01-05") == "2024-01-05"
+    assert parse_statement_date("01/05/2024") == "2024-01-05"
+    assert parse_statement_date("Jan 5", default_year=2024) == "2024-01-05"
+    assert parse_statement_date("Jan 5") is None
+    assert parse_statement_date("Rent Payment") is None
+
+def test_parse_rows_with_header_and_debit_credit_columns():
+    rows = [
+        ["Date", "Description", "Debit", "Credit"],
+        ["2024-02-01", "Rent Payment", "1,000.00", ""],
+        ["2024-02-01", "Salary Deposit", "", "2,000.00"],
+        ["2024-02-02", "Unreadable", "", ""],
+    ]
+    transactions, candidates = _parse_rows(rows, _find_header(rows), None)
+    assert candidates == 3
+    assert transactions == [
+        {"date": "2024-02-01", "description": "Rent Payment", "amount": -1000.0},
+        {"date": "2024-02-01", "description": "Salary Deposit", "amount": 2000.0},
+    ]
+
+def test_parse_rows_skips_short_rows():
+    rows = [
+        ["Date", "Description", "Debit", "Credit"],
+        ["2024-02-01", "Rent Payment", "1,000.00"],
+        ["2024-02-02", "Coffee"],
+        ["2024-02-03"],
+        ["2024-02-04", "Salary Deposit", "", "2,000.00"],
+    ]
+    transactions, candidates = _parse_rows(rows, _find_header(rows), None)
+    assert candidates == 4
+    assert transactions == [
+        {"date": "2024-02-01", "description": "Rent Payment", "amount": -1000.0},
+        {"date": "2024-02-04", "description": "Salary Deposit", "amount": 2000.0},
+    ]
+
+def test_parse_rows_skips_balance_lines():
+    rows = [
+        ["01/31", "Closing", "Balance", "1,234.56"],
+        ["02/01", "Opening", "balance", "980.00"],
+        ["02/03", "Corner", "Bakery", "-4.50"],
+        ["02/28", "Total", "fees", "0.00"],
+    ]
+    transactions, candidates = _parse_rows(rows, None, 2024)
+    assert candidates == 1
+    assert transactions == [{"date": "2024-02-03", "description": "Corner Bakery", "amount": -4.5}]
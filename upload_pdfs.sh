@@ -51,8 +51,8 @@ for ((i=0; i<total_files; i++)); do
     response_body=$(echo "$response" | sed '$d')
     http_code=$(echo "$response" | tail -n 1)
 
-    if [ "$http_code" -eq 200 ]; then
-        echo "✓ Successfully uploaded $pdf"
+    if [ "$http_code" -eq 200 ] || [ "$http_code" -eq 202 ]; then
+        echo "✓ Successfully uploaded $pdf (queued: $response_body)"
         # Optional: Add a small delay between uploads to be gentle on the server
         sleep 2
     else